@@ -0,0 +1,205 @@
+"""
+Prometheus-style metrics for the inference server
+Exposed in text exposition format at /metrics
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# Latency buckets in seconds, from tokenization (ms) to cold IPFS downloads (minutes)
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def mean(self, **labels) -> float:
+        series = self._values.get(self._key(labels))
+        if not series or not series[-1]:
+            return 0.0
+        return series[-2] / series[-1]
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, series in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(self.label_names, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.label_names, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+stage_latency = Histogram(
+    "dehug_stage_duration_seconds",
+    "Time spent in each inference stage (download, unzip, load, tokenize, forward, decode)",
+    ("stage", "task", "model_hash"),
+)
+request_latency = Histogram(
+    "dehug_request_duration_seconds",
+    "End-to-end inference request latency",
+    ("task", "model_hash", "status"),
+)
+requests_total = Counter(
+    "dehug_requests_total", "Inference requests handled", ("task", "status")
+)
+cache_hits = Counter(
+    "dehug_model_cache_hits_total", "Model loads served from memory", ("task", "model_hash")
+)
+cache_misses = Counter(
+    "dehug_model_cache_misses_total", "Model loads that hit disk or IPFS", ("task", "model_hash")
+)
+requests_cancelled = Counter(
+    "dehug_requests_cancelled_total",
+    "Requests rejected up front or stopped early (rejected, deadline, disconnected)",
+    ("task", "reason"),
+)
+prefix_cache_lookups = Counter(
+    "dehug_prefix_cache_lookups_total",
+    "Text-generation prompts looked up in the prefix cache, by result (hit, miss)",
+    ("model_hash", "result"),
+)
+prefix_cache_tokens = Counter(
+    "dehug_prefix_cache_tokens_total",
+    "Prompt tokens reused from the prefix cache or computed",
+    ("model_hash", "kind"),
+)
+queue_depth = Gauge("dehug_inference_queue_depth", "Inference requests currently in flight")
+scheduler_queued = Gauge(
+    "dehug_scheduler_queued", "Requests waiting for an inference slot", ("priority",)
+)
+scheduler_wait = Histogram(
+    "dehug_scheduler_wait_seconds",
+    "Time requests waited for an inference slot",
+    ("priority", "task"),
+)
+models_preloaded = Counter(
+    "dehug_models_preloaded_total", "Popular models loaded ahead of demand", ("task",)
+)
+models_unloaded = Counter(
+    "dehug_models_unloaded_total", "Models dropped from memory after sitting idle", ("task",)
+)
+models_loaded = Gauge("dehug_models_loaded", "Models currently held in memory")
+queue_depth.set(0)
+models_loaded.set(0)
+
+REGISTRY = [
+    stage_latency,
+    request_latency,
+    requests_total,
+    requests_cancelled,
+    cache_hits,
+    cache_misses,
+    prefix_cache_lookups,
+    prefix_cache_tokens,
+    queue_depth,
+    scheduler_queued,
+    scheduler_wait,
+    models_preloaded,
+    models_unloaded,
+    models_loaded,
+]
+
+
+def stage_timer(stage: str, task: str, model_hash: str):
+    """Context manager timing one stage of a request"""
+    return stage_latency.time(stage=stage, task=task, model_hash=model_hash)
+
+
+def render_metrics() -> str:
+    """Render all metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,125 @@
+"""
+ONNX Runtime execution engine for classification models on CPU
+
+A model is exported to ONNX once, into ONNX_CACHE_DIR/<hash>/<task>.onnx
+(or a pre-exported model.onnx / onnx/model.onnx shipped with the model is
+used), and served by an InferenceSession. OnnxModel stands in for the torch
+model: calling it returns an object with torch ``.logits``, so the task code
+doesn't care which engine ran it.
+"""
+
+import inspect
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+
+from config import ONNX_CACHE_DIR, ONNX_THREADS
+from logger import logger
+
+ONNX_TASKS = ("text-classification", "image-classification")
+ONNX_OPSET = 17
+
+# Inputs that vary in size: batch for everything, sequence length for text
+DYNAMIC_AXES = {
+    "input_ids": {0: "batch", 1: "sequence"},
+    "attention_mask": {0: "batch", 1: "sequence"},
+    "token_type_ids": {0: "batch", 1: "sequence"},
+    "pixel_values": {0: "batch"},
+}
+
+
+class OnnxOutput:
+    def __init__(self, logits):
+        self.logits = logits
+
+
+class OnnxModel:
+    """InferenceSession wrapped to be called like a transformers model"""
+
+    def __init__(self, session, config):
+        self.session = session
+        self.config = config
+        self.input_names = [i.name for i in session.get_inputs()]
+
+    def eval(self):
+        return self
+
+    def __call__(self, **inputs) -> OnnxOutput:
+        import torch
+
+        feed = {name: inputs[name].numpy() for name in self.input_names if name in inputs}
+        logits = self.session.run(["logits"], feed)[0]
+        return OnnxOutput(torch.from_numpy(logits))
+
+
+def find_onnx_model(model_path: Path, model_hash: str, task: str) -> Path:
+    """Pre-exported ONNX file shipped with the model, else our export location"""
+    for candidate in (model_path / "model.onnx", model_path / "onnx" / "model.onnx"):
+        if candidate.exists():
+            return candidate
+    return Path(ONNX_CACHE_DIR) / model_hash / f"{task}.onnx"
+
+
+def example_inputs(model_obj: Dict[str, Any], task: str) -> Dict[str, Any]:
+    if task == "text-classification":
+        return dict(model_obj["tokenizer"]("Hello world", return_tensors="pt"))
+
+    from PIL import Image
+
+    return dict(model_obj["processor"](Image.new("RGB", (224, 224)), return_tensors="pt"))
+
+
+def export_onnx(model, inputs: Dict[str, Any], onnx_path: Path):
+    """Export a torch classification model with dynamic batch (and sequence) axes"""
+    import torch
+
+    # Graph inputs are positional, so names must follow forward()'s argument order
+    names: List[str] = [p for p in inspect.signature(model.forward).parameters if p in inputs]
+    onnx_path.parent.mkdir(parents=True, exist_ok=True)
+    partial = onnx_path.with_name(f"{onnx_path.name}.{os.getpid()}.partial")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            ({name: inputs[name] for name in names},),
+            str(partial),
+            input_names=names,
+            output_names=["logits"],
+            dynamic_axes={**{n: DYNAMIC_AXES[n] for n in names if n in DYNAMIC_AXES}, "logits": {0: "batch"}},
+            opset_version=ONNX_OPSET,
+            dynamo=False,
+        )
+    os.replace(partial, onnx_path)
+
+
+def create_session(onnx_path: Path):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = ONNX_THREADS
+    # One request per session call; parallelism comes from intra-op threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    return ort.InferenceSession(str(onnx_path), options, providers=["CPUExecutionProvider"])
+
+
+def to_onnx(model_obj: Dict[str, Any], model_path: Path, model_hash: str, task: str) -> bool:
+    """Swap a loaded torch model for an ONNX Runtime one; False if that isn't possible
+
+    On failure (an architecture the exporter can't trace, a broken
+    pre-exported file) the torch model is left in place.
+    """
+    onnx_path = find_onnx_model(model_path, model_hash, task)
+    torch_model = model_obj["model"]
+    try:
+        if not onnx_path.exists():
+            logger.info(f"Exporting {model_hash} ({task}) to ONNX at {onnx_path}")
+            export_onnx(torch_model, example_inputs(model_obj, task), onnx_path)
+        session = create_session(onnx_path)
+    except Exception as e:
+        logger.warning(f"ONNX engine unavailable for {model_hash} ({task}), using torch: {e}")
+        return False
+
+    model_obj["model"] = OnnxModel(session, torch_model.config)
+    logger.info(f"Serving {model_hash} ({task}) with ONNX Runtime, {ONNX_THREADS} threads")
+    return True
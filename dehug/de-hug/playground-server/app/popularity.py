@@ -0,0 +1,214 @@
+"""
+Popularity-driven preloading and idle unloading
+
+Every POPULARITY_INTERVAL seconds the most downloaded models are read from
+the tracker (or a local JSON stand-in). The top PRELOAD_TOP_N are loaded and
+warmed up while memory allows, so hot models never pay a cold load. Loaded
+models idle for longer than IDLE_UNLOAD_TTL that are no longer in the top N
+are dropped from memory; their files stay on disk.
+"""
+
+import asyncio
+import gc
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from config import (CACHE_MAX_MODELS, IDLE_UNLOAD_TTL, LOCAL_MODEL_DIR, POPULARITY_INTERVAL,
+                    POPULARITY_SOURCE, PRELOAD_MEMORY_HEADROOM_MB, PRELOAD_TOP_N)
+from logger import logger
+from .metrics import models_preloaded, models_unloaded
+from .services import disk_index, load_model, model_cache, model_tasks, warm_up_model
+
+# Model class name suffix -> task, for models never loaded by this server
+ARCHITECTURE_TASKS = (
+    ("ForCausalLM", "text-generation"),
+    ("LMHeadModel", "text-generation"),
+    ("ForSequenceClassification", "text-classification"),
+    ("ForImageClassification", "image-classification"),
+    ("ForCTC", "speech-recognition"),
+    ("ForSpeechSeq2Seq", "speech-recognition"),
+)
+
+# The tracker ranks datasets too; fetch extra so N models remain after skipping them
+FETCH_FACTOR = 4
+
+# Reported by /popularity
+popularity_state: Dict[str, Any] = {
+    "source": POPULARITY_SOURCE,
+    "last_refresh": None,
+    "ranking": [],
+    "preloaded": [],
+    "unloaded": [],
+    "error": None,
+}
+
+
+def available_memory_mb() -> Optional[float]:
+    """MemAvailable from /proc/meminfo, or None where it can't be read"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def parse_popularity(data: Any) -> List[Dict[str, Any]]:
+    """Normalize tracker stats or a stand-in list to entries, most downloaded first"""
+    if isinstance(data, dict):
+        entries = [
+            {
+                "model_hash": name,
+                "downloads": counts.get("total", 0) if isinstance(counts, dict) else counts,
+                "task": None,
+            }
+            for name, counts in data.items()
+        ]
+    else:
+        entries = [
+            {
+                "model_hash": entry["model_hash"],
+                "downloads": entry.get("downloads", 0),
+                "task": entry.get("task"),
+            }
+            for entry in data
+        ]
+    return sorted(entries, key=lambda e: e["downloads"], reverse=True)
+
+
+async def fetch_popularity(source: str, limit: int) -> List[Dict[str, Any]]:
+    if source.startswith(("http://", "https://")):
+        import httpx
+
+        async with httpx.AsyncClient(timeout=30) as client:
+            response = await client.get(source, params={"top": limit})
+            response.raise_for_status()
+            data = response.json()
+    else:
+        data = json.loads(await asyncio.to_thread(Path(source).read_text))
+    return parse_popularity(data)[:limit]
+
+
+def infer_task(model_hash: str) -> Optional[str]:
+    """Task from the model's config.json architectures, if it is on disk"""
+    paths = [Path(LOCAL_MODEL_DIR) / model_hash]
+    if model_hash in disk_index:
+        paths.append(Path(disk_index[model_hash]["path"]))
+
+    for path in paths:
+        config_path = path / "config.json"
+        if not config_path.exists():
+            continue
+        try:
+            architectures = json.loads(config_path.read_text()).get("architectures") or []
+        except ValueError:
+            continue
+        for architecture in architectures:
+            for suffix, task in ARCHITECTURE_TASKS:
+                if architecture.endswith(suffix):
+                    return task
+    return None
+
+
+def resolve_task(entry: Dict[str, Any]) -> Optional[str]:
+    return entry.get("task") or model_tasks.get(entry["model_hash"]) or infer_task(entry["model_hash"])
+
+
+def is_loaded(model_hash: str, task: str) -> bool:
+    return any(m["hash"] == model_hash and m["task"] == task for m in model_cache.values())
+
+
+def unload_idle(pinned: Set[str]) -> List[str]:
+    """Drop models idle past IDLE_UNLOAD_TTL, except popular ones"""
+    if IDLE_UNLOAD_TTL <= 0:
+        return []
+
+    cutoff = datetime.now() - timedelta(seconds=IDLE_UNLOAD_TTL)
+    unloaded = []
+    for cache_key, model_obj in list(model_cache.items()):
+        if model_obj["last_used"] < cutoff and model_obj["hash"] not in pinned:
+            model_cache.pop(cache_key, None)
+            models_unloaded.inc(task=model_obj["task"])
+            unloaded.append(cache_key)
+            logger.info(f"Unloaded {cache_key}, idle since {model_obj['last_used'].isoformat()}")
+    if unloaded:
+        gc.collect()
+    return unloaded
+
+
+async def preload_popular(candidates: List[Dict[str, Any]]) -> List[str]:
+    """Load and warm up popular models, most downloaded first, while memory allows"""
+    preloaded = []
+    for entry in candidates:
+        model_hash, task = entry["model_hash"], entry["task"]
+        if is_loaded(model_hash, task):
+            continue
+        if len(model_cache) >= CACHE_MAX_MODELS:
+            logger.info(f"Model cache full ({CACHE_MAX_MODELS}), not preloading {model_hash}")
+            break
+
+        # Size on disk approximates the memory the weights need
+        needed = disk_index.get(model_hash, {}).get("size_mb", 0)
+        available = available_memory_mb()
+        if available is not None and available - needed < PRELOAD_MEMORY_HEADROOM_MB:
+            logger.info(
+                f"Not preloading {model_hash}: {available:.0f} MB available, needs {needed:.0f} MB"
+            )
+            break
+
+        try:
+            model_obj = await load_model(model_hash, task)
+            await asyncio.to_thread(warm_up_model, model_obj)
+        except Exception as e:
+            logger.warning(f"Failed to preload popular model {model_hash}: {getattr(e, 'detail', e)}")
+            continue
+        models_preloaded.inc(task=task)
+        preloaded.append(model_hash)
+        logger.info(f"Preloaded popular model {model_hash} for {task}")
+    return preloaded
+
+
+async def refresh_popularity():
+    """One round: rank models, unload idle unpopular ones, preload popular ones"""
+    candidates: List[Dict[str, Any]] = []
+    if POPULARITY_SOURCE:
+        ranking = await fetch_popularity(POPULARITY_SOURCE, PRELOAD_TOP_N * FETCH_FACTOR)
+        for entry in ranking:
+            task = resolve_task(entry)
+            if task:
+                candidates.append({**entry, "task": task})
+            if len(candidates) == PRELOAD_TOP_N:
+                break
+
+    # Unload first so the memory is there for preloading
+    unloaded = unload_idle({c["model_hash"] for c in candidates})
+    preloaded = await preload_popular(candidates)
+
+    popularity_state.update(
+        {
+            "last_refresh": datetime.now().isoformat(),
+            "ranking": candidates,
+            "error": None,
+        }
+    )
+    popularity_state["preloaded"] = (popularity_state["preloaded"] + preloaded)[-50:]
+    popularity_state["unloaded"] = (popularity_state["unloaded"] + unloaded)[-50:]
+
+
+async def popularity_loop():
+    """Refresh popularity forever; errors are logged and retried next round"""
+    interval = POPULARITY_INTERVAL
+    if not POPULARITY_SOURCE and IDLE_UNLOAD_TTL > 0:
+        # Only unloading: check often enough to honour the TTL
+        interval = min(POPULARITY_INTERVAL, IDLE_UNLOAD_TTL)
+    while True:
+        try:
+            await refresh_popularity()
+        except Exception as e:
+            popularity_state["error"] = str(e)
+            logger.error(f"Popularity refresh failed: {e}")
+        await asyncio.sleep(interval)
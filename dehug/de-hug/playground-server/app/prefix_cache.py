@@ -0,0 +1,140 @@
+"""
+Prompt prefix cache for text generation
+
+Keeps the attention key/values computed for recently seen prompts, so a new
+prompt sharing a prefix with one of them (a long system prompt, a growing
+chat history) only runs the model over the tokens after that prefix.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import torch
+
+# Per layer: (key, value), each shaped (batch, heads, seq_len, head_dim)
+PastKeyValues = Tuple[Tuple["torch.Tensor", ...], ...]
+
+
+def common_prefix_length(a: "torch.Tensor", b: "torch.Tensor") -> int:
+    """Number of leading tokens two equally long 1-D id tensors share"""
+    mismatches = (a != b).nonzero()
+    return int(mismatches[0]) if len(mismatches) else len(a)
+
+
+def to_legacy(past: Any) -> PastKeyValues:
+    """Tuple form of a model's past_key_values (newer models return Cache objects)"""
+    if hasattr(past, "to_legacy_cache"):
+        return past.to_legacy_cache()
+    return past
+
+
+def slice_past(past: PastKeyValues, length: int) -> PastKeyValues:
+    """Key/values for the first ``length`` tokens; views, no copy"""
+    return tuple(tuple(t[:, :, :length] for t in layer) for layer in past)
+
+
+def past_nbytes(past: PastKeyValues) -> int:
+    return sum(t.nelement() * t.element_size() for layer in past for t in layer)
+
+
+class PrefixCache:
+    """LRU of prompt token ids -> past key/values for one model, bounded by bytes"""
+
+    def __init__(self, max_bytes: int, min_tokens: int = 32):
+        self.max_bytes = max_bytes
+        self.min_tokens = min_tokens
+        # Disabled for models whose cache layout can't be sliced by sequence
+        self.enabled = max_bytes > 0
+
+        # id -> (token ids, past key/values, size in bytes)
+        self._entries: "OrderedDict[int, Tuple[Any, PastKeyValues, int]]" = OrderedDict()
+        self._next_id = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.prompt_tokens = 0
+        self.reused_tokens = 0
+        self.evictions = 0
+
+    def lookup(self, tokens: "torch.Tensor") -> Tuple[int, Optional[PastKeyValues]]:
+        """Longest cached prefix of a prompt's 1-D token ids
+
+        At most ``len(tokens) - 1`` tokens are reused: the model still has to
+        run over the last one to produce the first next-token logits.
+        """
+        limit = len(tokens) - 1
+        best_length, best_id = 0, None
+        with self._lock:
+            for entry_id, (cached, _, _) in self._entries.items():
+                n = min(len(cached), limit)
+                if n <= best_length:
+                    continue
+                length = common_prefix_length(cached[:n], tokens[:n])
+                if length > best_length:
+                    best_length, best_id = length, entry_id
+
+            self.lookups += 1
+            self.prompt_tokens += len(tokens)
+            if best_id is None or best_length < self.min_tokens:
+                return 0, None
+            self.hits += 1
+            self.reused_tokens += best_length
+            self._entries.move_to_end(best_id)
+            past = self._entries[best_id][1]
+        return best_length, slice_past(past, best_length)
+
+    def insert(self, tokens: "torch.Tensor", past: Any):
+        """Cache the key/values computed for ``tokens``"""
+        past = to_legacy(past)
+        if not self.enabled or len(tokens) < self.min_tokens:
+            return
+        if not all(t.dim() == 4 and t.shape[2] == len(tokens) for layer in past for t in layer):
+            self.enabled = False
+            return
+
+        nbytes = past_nbytes(past)
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            for entry_id, (cached, _, size) in list(self._entries.items()):
+                n = min(len(cached), len(tokens))
+                if common_prefix_length(cached[:n], tokens[:n]) < n:
+                    continue
+                if len(cached) >= len(tokens):
+                    # Already covered by a longer cached prompt
+                    self._entries.move_to_end(entry_id)
+                    return
+                # A prefix of this prompt: covered by it from now on
+                del self._entries[entry_id]
+                self._bytes -= size
+
+            self._entries[self._next_id] = (tokens.clone(), past, nbytes)
+            self._next_id += 1
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, _, size) = self._entries.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "size_mb": self._bytes / (1024 * 1024),
+            "max_mb": self.max_bytes / (1024 * 1024),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_ratio": self.hits / self.lookups if self.lookups else 0.0,
+            # Share of prompt tokens that didn't have to be recomputed
+            "token_hit_ratio": self.reused_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+            "evictions": self.evictions,
+        }
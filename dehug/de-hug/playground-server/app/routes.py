@@ -1,6 +1,6 @@
 from datetime import datetime
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from transformers import __version__ as transformers_version
+from fastapi import APIRouter, File, Header, Request, UploadFile, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from .schema import (
     InferenceResponse,
     InferenceRequest,
@@ -10,20 +10,42 @@ from .schema import (
     SpeechRecognitionParams,
 )
 from pathlib import Path
-from config import MODEL_CACHE_DIR
+from config import DISCONNECT_POLL_INTERVAL, LOCAL_MODEL_DIR, ONNX_CACHE_DIR, REQUEST_TIMEOUT
+from .metrics import (
+    models_loaded,
+    queue_depth,
+    render_metrics,
+    request_latency,
+    requests_cancelled,
+    requests_total,
+    stage_timer,
+)
+from .popularity import popularity_state
+from .scheduler import PRIORITIES, Ticket, scheduler
 from .services import (
+    CancelToken,
+    RequestCancelled,
+    estimate_service_time,
     load_model,
+    record_service_time,
     run_text_generation,
     run_text_classification,
-    get_model_size,
     model_cache,
+    disk_index,
+    forget_disk_model,
+    readiness,
 )
+import asyncio
+import importlib.metadata
 import json
+import math
 import os
 import tempfile
+import time
 from pathlib import Path
 from datetime import datetime
 import uuid
+from typing import Optional
 from logger import logger
 from datetime import datetime
 
@@ -35,7 +57,9 @@ async def root():
     return {
         "message": "DeHug Inference API",
         "version": "1.0.0",
-        "endpoints": ["/infer", "/models", "/health"],
+        "endpoints": [
+            "/infer", "/models", "/health", "/ready", "/metrics", "/scheduler", "/popularity",
+        ],
         "supported_tasks": [
             "text-generation",
             "text-classification",
@@ -45,6 +69,17 @@ async def root():
     }
 
 
+def package_version(name: str):
+    """Installed version from package metadata, without importing the package"""
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+transformers_version = package_version("transformers")
+
+
 @router.get("/health")
 async def health_check():
     return {
@@ -55,38 +90,150 @@ async def health_check():
     }
 
 
+@router.get("/ready")
+async def readiness_check():
+    """Report ready only once startup preloading has finished"""
+    body = {
+        "status": "ready" if readiness["ready"] else "loading",
+        "loaded": readiness["loaded"],
+        "failed": readiness["failed"],
+        "started_at": readiness["started_at"].isoformat()
+        if readiness["started_at"]
+        else None,
+        "finished_at": readiness["finished_at"].isoformat()
+        if readiness["finished_at"]
+        else None,
+    }
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=body)
+
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    models_loaded.set(len(model_cache))
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+def record_request(task: str, model_hash: str, status: str, processing_time: float):
+    """Record end-to-end latency and outcome for a finished request"""
+    request_latency.observe(
+        processing_time, task=task, model_hash=model_hash, status=status
+    )
+    requests_total.inc(task=task, status=status)
+
+
+async def watch_disconnect(http_request: Request, token: CancelToken):
+    """Cancel the token as soon as the client goes away"""
+    while not token.cancelled:
+        if await http_request.is_disconnected():
+            token.cancel("disconnected")
+            return
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+async def wait_for_slot(ticket: Ticket, token: CancelToken, watcher: asyncio.Task):
+    """Wait for the scheduler to grant a slot, giving up at the deadline or on disconnect"""
+    while not ticket.granted.done():
+        token.check()
+        await asyncio.wait(
+            {ticket.granted, watcher},
+            timeout=max(token.deadline - time.monotonic(), 0),
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+
+
+def client_id(http_request: Request, x_client_id: Optional[str]) -> str:
+    """Fair-share identity of the caller: X-Client-Id, else its address"""
+    if x_client_id:
+        return x_client_id
+    return http_request.client.host if http_request.client else "unknown"
+
+
+def resolve_priority(priority: Optional[str]) -> str:
+    priority = priority or "normal"
+    if priority not in PRIORITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported priority: {priority}. Choose one of {list(PRIORITIES)}",
+        )
+    return priority
+
+
+def reject_if_late(model_hash: str, task: str, priority: str, timeout: float):
+    """503 up front if the request can't finish in time behind the current queue"""
+    # Work queued ahead at this priority or above, plus this request's own
+    estimated = scheduler.backlog(priority) + (estimate_service_time(model_hash, task) or 0.0)
+    if estimated > timeout:
+        requests_cancelled.inc(task=task, reason="rejected")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Cannot finish within {timeout:.1f}s: estimated {estimated:.1f}s with the current queue",
+            headers={"Retry-After": str(math.ceil(estimated - timeout))},
+        )
+
+
+def cancelled_response(e: RequestCancelled, request_id: str, task: str, model_hash: str, start_time: datetime):
+    """504 past the deadline; 499 (client closed request) after a disconnect"""
+    processing_time = (datetime.now() - start_time).total_seconds()
+    logger.info(
+        f"Inference request {request_id} cancelled ({e.reason}) after {processing_time:.2f}s"
+    )
+    record_request(task, model_hash, e.reason, processing_time)
+    requests_cancelled.inc(task=task, reason=e.reason)
+    if e.reason == "deadline":
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+    # The client is gone; nobody reads this
+    return JSONResponse(status_code=499, content={"detail": "Client disconnected"})
+
+
+@router.get("/popularity")
+async def popularity_status():
+    """Models ranked for preloading, and recent preloads and idle unloads"""
+    return popularity_state
+
+
+@router.get("/scheduler")
+async def scheduler_stats():
+    """Queue depths, running requests and mean waits per model and per client"""
+    return scheduler.stats()
+
+
 @router.get("/models")
 async def list_cached_models():
     """List all cached models"""
     models = []
-    for cache_key, model_obj in model_cache.items():
-        model_hash, task = cache_key.split("_", 1)
-        model_path = Path(model_obj["path"])
-
+    loaded_hashes = set()
+    for model_obj in model_cache.values():
+        loaded_hashes.add(model_obj["hash"])
         models.append(
             {
-                "hash": model_hash,
-                "task": task,
+                "hash": model_obj["hash"],
+                "task": model_obj["task"],
+                "precision": model_obj["precision"],
+                "engine": model_obj["engine"],
                 "status": "loaded",
                 "cached": True,
-                "size_mb": get_model_size(model_path),
+                "size_mb": model_obj["size_mb"],
                 "loaded_at": model_obj["loaded_at"].isoformat(),
                 "last_used": model_obj["last_used"].isoformat(),
+                "prefix_cache": model_obj["prefix_cache"].stats()
+                if "prefix_cache" in model_obj
+                else None,
             }
         )
 
-    # Also check disk cache
-    cached_dirs = [d for d in Path(MODEL_CACHE_DIR).iterdir() if d.is_dir()]
-    for model_dir in cached_dirs:
-        model_hash = model_dir.name
-        if not any(m["hash"] == model_hash for m in models):
+    # Also report models that are only on disk
+    for model_hash, entry in disk_index.items():
+        if model_hash not in loaded_hashes:
             models.append(
                 {
                     "hash": model_hash,
                     "task": "unknown",
+                    "precision": None,
+                    "engine": None,
                     "status": "cached",
                     "cached": True,
-                    "size_mb": get_model_size(model_dir),
+                    "size_mb": entry["size_mb"],
                     "loaded_at": None,
                     "last_used": None,
                 }
@@ -96,14 +243,33 @@ async def list_cached_models():
 
 
 @router.post("/infer", response_model=InferenceResponse)
-async def run_inference(request: InferenceRequest):
-    """Main inference endpoint"""
+async def run_inference(
+    request: InferenceRequest,
+    http_request: Request,
+    x_request_timeout: Optional[float] = Header(default=None, gt=0),
+    x_priority: Optional[str] = Header(default=None),
+    x_client_id: Optional[str] = Header(default=None),
+):
+    """Main inference endpoint
+
+    The request's deadline is ``timeout`` seconds (or the X-Request-Timeout
+    header, or REQUEST_TIMEOUT) from arrival. Requests that can't finish in
+    time behind the current queue are rejected with 503 up front; generation
+    stops early when the deadline passes (504) or the client disconnects.
+    Inference runs when the scheduler grants a slot, by priority and then
+    fair share between clients and models.
+    """
     request_id = str(uuid.uuid4())
     start_time = datetime.now()
+    timeout = request.timeout or x_request_timeout or REQUEST_TIMEOUT
+    token = CancelToken(deadline=time.monotonic() + timeout)
 
     logger.info(
         f"Inference request {request_id}: {request.model_hash} - {request.task}"
     )
+    queue_depth.inc()
+    watcher = asyncio.create_task(watch_disconnect(http_request, token))
+    ticket = None
 
     try:
         # Validate task
@@ -117,8 +283,26 @@ async def run_inference(request: InferenceRequest):
                 status_code=400, detail=f"Unsupported task: {request.task}"
             )
 
+        priority = resolve_priority(request.priority or x_priority)
+        reject_if_late(request.model_hash, request.task, priority, timeout)
+
+        # Take a slot before loading, so cold loads are scheduled like inference
+        ticket = scheduler.submit(
+            request.model_hash,
+            request.task,
+            client_id(http_request, x_client_id),
+            priority,
+            estimate_service_time(request.model_hash, request.task),
+        )
+        await wait_for_slot(ticket, token, watcher)
+
         # Load model
-        model_obj = await load_model(request.model_hash, request.task)
+        model_obj = await load_model(
+            request.model_hash, request.task, request.precision, request.engine
+        )
+        # Loading a cold model may have used up the deadline
+        token.check()
+        inference_start = time.monotonic()
 
         # Parse parameters based on task
         if request.task == "text-generation":
@@ -127,7 +311,9 @@ async def run_inference(request: InferenceRequest):
                 raise HTTPException(
                     status_code=400, detail="input_text is required for text generation"
                 )
-            result = await run_text_generation(model_obj, request.input_text, params)
+            result = await run_text_generation(
+                model_obj, request.input_text, params, token
+            )
 
         elif request.task == "text-classification":
             params = TextClassificationParams(**request.parameters)
@@ -154,11 +340,15 @@ async def run_inference(request: InferenceRequest):
                 detail="Speech recognition not yet implemented - requires file upload",
             )
 
+        record_service_time(
+            request.model_hash, request.task, time.monotonic() - inference_start
+        )
         processing_time = (datetime.now() - start_time).total_seconds()
 
         logger.info(
             f"Inference request {request_id} completed in {processing_time:.2f}s"
         )
+        record_request(request.task, request.model_hash, "success", processing_time)
 
         return InferenceResponse(
             success=True,
@@ -166,17 +356,24 @@ async def run_inference(request: InferenceRequest):
             model_info={
                 "hash": request.model_hash,
                 "task": request.task,
+                "precision": model_obj["precision"],
+                "engine": model_obj["engine"],
                 "cached": True,
             },
             processing_time=processing_time,
             request_id=request_id,
         )
 
+    except RequestCancelled as e:
+        return cancelled_response(e, request_id, request.task, request.model_hash, start_time)
     except HTTPException:
+        processing_time = (datetime.now() - start_time).total_seconds()
+        record_request(request.task, request.model_hash, "rejected", processing_time)
         raise
     except Exception as e:
         logger.error(f"Inference request {request_id} failed: {e}")
         processing_time = (datetime.now() - start_time).total_seconds()
+        record_request(request.task, request.model_hash, "error", processing_time)
 
         return InferenceResponse(
             success=False,
@@ -184,103 +381,135 @@ async def run_inference(request: InferenceRequest):
             processing_time=processing_time,
             request_id=request_id,
         )
+    finally:
+        if ticket is not None:
+            scheduler.release(ticket)
+        watcher.cancel()
+        queue_depth.dec()
 
 
 @router.post("/infer-with-files")
 async def run_inference_with_files(
-    model_hash: str, task: str, file: UploadFile = File(...), parameters: str = "{}"
+    model_hash: str,
+    task: str,
+    http_request: Request,
+    file: UploadFile = File(...),
+    parameters: str = "{}",
+    x_request_timeout: Optional[float] = Header(default=None, gt=0),
+    x_priority: Optional[str] = Header(default=None),
+    x_client_id: Optional[str] = Header(default=None),
 ):
-    """Inference endpoint for file uploads (images, audio)"""
+    """Inference endpoint for file uploads (images, audio)
+
+    Deadlines (X-Request-Timeout, or REQUEST_TIMEOUT), disconnects and
+    scheduling are handled as for /infer. A forward pass or speech pipeline
+    can't be interrupted once started; cancellation takes effect before it.
+    """
     request_id = str(uuid.uuid4())
     start_time = datetime.now()
+    timeout = x_request_timeout or REQUEST_TIMEOUT
+    token = CancelToken(deadline=time.monotonic() + timeout)
+    queue_depth.inc()
+    watcher = asyncio.create_task(watch_disconnect(http_request, token))
+    ticket = None
+    temp_file_path = None
 
     try:
         params_dict = json.loads(parameters)
+        priority = resolve_priority(x_priority)
 
         if task == "image-classification":
-            # Handle image upload
             if not file.content_type.startswith("image/"):
                 raise HTTPException(status_code=400, detail="File must be an image")
+            suffix = ".jpg"
+        elif task == "speech-recognition":
+            if not file.content_type.startswith("audio/"):
+                raise HTTPException(
+                    status_code=400, detail="File must be an audio file"
+                )
+            suffix = ".wav"
+        else:
+            raise HTTPException(
+                status_code=400, detail=f"Task {task} does not support file upload"
+            )
 
-            # Read image
-            contents = await file.read()
-            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as temp_file:
-                temp_file.write(contents)
-                temp_file_path = temp_file.name
-
-            try:
-                image = Image.open(temp_file_path)
-
-                # Load model
-                model_obj = await load_model(model_hash, task)
-                processor = model_obj["processor"]
-                model = model_obj["model"]
+        reject_if_late(model_hash, task, priority, timeout)
 
-                # Process image
-                inputs = processor(image, return_tensors="pt")
+        # Save the upload temporarily
+        contents = await file.read()
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+            temp_file.write(contents)
+            temp_file_path = temp_file.name
 
-                # Run inference
-                with torch.no_grad():
-                    outputs = model(**inputs)
-                    predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
+        # Take a slot before loading, so cold loads are scheduled like inference
+        ticket = scheduler.submit(
+            model_hash, task, client_id(http_request, x_client_id), priority,
+            estimate_service_time(model_hash, task),
+        )
+        await wait_for_slot(ticket, token, watcher)
 
-                # Get top predictions
-                params = ImageClassificationParams(**params_dict)
-                top_k = min(params.top_k, len(predictions[0]))
-                top_predictions = torch.topk(predictions[0], top_k)
+        # Load model
+        model_obj = await load_model(model_hash, task)
+        # Loading a cold model may have used up the deadline
+        token.check()
+        inference_start = time.monotonic()
 
-                if hasattr(model.config, "id2label"):
-                    labels = model.config.id2label
-                else:
-                    labels = {i: f"LABEL_{i}" for i in range(len(predictions[0]))}
+        if task == "image-classification":
+            import torch
+            from PIL import Image
 
-                results = []
-                for score, idx in zip(
-                    top_predictions.values.tolist(), top_predictions.indices.tolist()
-                ):
-                    if score >= params.confidence_threshold:
-                        results.append({"label": labels[idx], "score": score})
+            processor = model_obj["processor"]
+            model = model_obj["model"]
 
-                result = {"predictions": results, "parameters_used": params_dict}
+            def preprocess():
+                return processor(Image.open(temp_file_path), return_tensors="pt")
 
-            finally:
-                os.unlink(temp_file_path)
+            def forward(inputs):
+                with torch.no_grad():
+                    outputs = model(**inputs)
+                    return torch.nn.functional.softmax(outputs.logits, dim=-1)
+
+            # Decode, preprocess and run off the event loop
+            with stage_timer("preprocess", task, model_hash):
+                inputs = await asyncio.to_thread(preprocess)
+            token.check()
+            with stage_timer("forward", task, model_hash):
+                predictions = await asyncio.to_thread(forward, inputs)
+
+            # Get top predictions
+            params = ImageClassificationParams(**params_dict)
+            top_k = min(params.top_k, len(predictions[0]))
+            top_predictions = torch.topk(predictions[0], top_k)
+
+            if hasattr(model.config, "id2label"):
+                labels = model.config.id2label
+            else:
+                labels = {i: f"LABEL_{i}" for i in range(len(predictions[0]))}
+
+            results = []
+            for score, idx in zip(
+                top_predictions.values.tolist(), top_predictions.indices.tolist()
+            ):
+                if score >= params.confidence_threshold:
+                    results.append({"label": labels[idx], "score": score})
+
+            result = {"predictions": results, "parameters_used": params_dict}
 
-        elif task == "speech-recognition":
-            # Handle audio upload
-            if not file.content_type.startswith("audio/"):
-                raise HTTPException(
-                    status_code=400, detail="File must be an audio file"
-                )
+        else:
+            pipe = model_obj["pipeline"]
 
-            # Save audio file temporarily
-            contents = await file.read()
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-                temp_file.write(contents)
-                temp_file_path = temp_file.name
-
-            try:
-                # Load model
-                model_obj = await load_model(model_hash, task)
-                pipe = model_obj["pipeline"]
-
-                # Process audio
-                params = SpeechRecognitionParams(**params_dict)
-                result = pipe(
-                    temp_file_path, return_timestamps=params.return_timestamps
+            # Process audio
+            params = SpeechRecognitionParams(**params_dict)
+            with stage_timer("forward", task, model_hash):
+                result = await asyncio.to_thread(
+                    pipe, temp_file_path, return_timestamps=params.return_timestamps
                 )
 
-                result = {"transcription": result, "parameters_used": params_dict}
-
-            finally:
-                os.unlink(temp_file_path)
-
-        else:
-            raise HTTPException(
-                status_code=400, detail=f"Task {task} does not support file upload"
-            )
+            result = {"transcription": result, "parameters_used": params_dict}
 
+        record_service_time(model_hash, task, time.monotonic() - inference_start)
         processing_time = (datetime.now() - start_time).total_seconds()
+        record_request(task, model_hash, "success", processing_time)
 
         return InferenceResponse(
             success=True,
@@ -290,14 +519,28 @@ async def run_inference_with_files(
             request_id=request_id,
         )
 
+    except RequestCancelled as e:
+        return cancelled_response(e, request_id, task, model_hash, start_time)
+    except HTTPException:
+        processing_time = (datetime.now() - start_time).total_seconds()
+        record_request(task, model_hash, "rejected", processing_time)
+        raise
     except Exception as e:
         processing_time = (datetime.now() - start_time).total_seconds()
+        record_request(task, model_hash, "error", processing_time)
         return InferenceResponse(
             success=False,
             error=str(e),
             processing_time=processing_time,
             request_id=request_id,
         )
+    finally:
+        if temp_file_path is not None:
+            os.unlink(temp_file_path)
+        if ticket is not None:
+            scheduler.release(ticket)
+        watcher.cancel()
+        queue_depth.dec()
 
 
 @router.delete("/models/{model_hash}")
@@ -309,12 +552,14 @@ async def clear_model_cache(model_hash: str):
             del model_cache[key]
             removed_keys.append(key)
 
-    # Also remove from disk
-    model_dir = Path(MODEL_CACHE_DIR) / model_hash
-    if model_dir.exists():
-        import shutil
+    # Also remove from disk, with its ONNX exports
+    import shutil
 
-        shutil.rmtree(model_dir)
+    model_dir = disk_index.get(model_hash, {}).get("path") or Path(LOCAL_MODEL_DIR) / model_hash
+    for path in (Path(model_dir), Path(ONNX_CACHE_DIR) / model_hash):
+        if path.exists():
+            shutil.rmtree(path)
+    forget_disk_model(model_hash)
 
     return {
         "message": f"Cleared model {model_hash} from cache",
@@ -327,11 +572,14 @@ async def clear_all_cache():
     """Clear all models from cache"""
     model_cache.clear()
 
-    # Clear disk cache
+    # Clear model directories on disk; the SDK's own index and store stay
     import shutil
 
-    if Path(MODEL_CACHE_DIR).exists():
-        shutil.rmtree(MODEL_CACHE_DIR)
-        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    for entry in list(disk_index.values()):
+        if Path(entry["path"]).exists():
+            shutil.rmtree(entry["path"])
+    disk_index.clear()
+    if Path(ONNX_CACHE_DIR).exists():
+        shutil.rmtree(ONNX_CACHE_DIR)
 
     return {"message": "Cleared all model cache"}
@@ -0,0 +1,219 @@
+"""
+Fair, priority-aware scheduling of inference work
+
+Requests wait in one FIFO queue per (priority, client, model, task) flow.
+Higher priority classes always go first. Within a class, flows share the
+inference slots by start-time fair queuing: each request costs its model's
+recent inference time divided by its flow's weight, so a burst of long
+generations can't starve short classification calls. A client's weight is
+split across its active flows, so spreading requests over many models
+doesn't buy a bigger share.
+"""
+
+import asyncio
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from config import CLIENT_WEIGHTS, MAX_INFLIGHT_PER_CLIENT, MAX_INFLIGHT_PER_MODEL, SCHEDULER_CONCURRENCY
+from .metrics import scheduler_queued, scheduler_wait
+
+PRIORITIES = ("high", "normal", "low")
+# Cost of a request for a model that hasn't run yet, in seconds
+DEFAULT_COST = 1.0
+
+# (priority, client, model_hash, task)
+FlowKey = Tuple[str, str, str, str]
+
+
+class Ticket:
+    """One request's place in the scheduler; ``granted`` resolves when it may run"""
+
+    def __init__(self, flow: FlowKey, cost: float, start: float, finish: float):
+        self.flow = flow
+        self.cost = cost
+        self.start = start
+        self.finish = finish
+        self.enqueued_at = time.monotonic()
+        self.granted: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    @property
+    def priority(self) -> str:
+        return self.flow[0]
+
+    @property
+    def client(self) -> str:
+        return self.flow[1]
+
+    @property
+    def model_hash(self) -> str:
+        return self.flow[2]
+
+
+class Scheduler:
+    def __init__(
+        self,
+        concurrency: int,
+        max_per_model: int = 0,
+        max_per_client: int = 0,
+        client_weights: Optional[Dict[str, float]] = None,
+    ):
+        self.concurrency = max(concurrency, 1)
+        self.max_per_model = max_per_model  # 0 means no cap
+        self.max_per_client = max_per_client
+        self.client_weights = client_weights or {}
+
+        self._flows: Dict[FlowKey, Deque[Ticket]] = {}
+        self._last_finish: Dict[FlowKey, float] = {}
+        self._vtime = 0.0
+        self._running: Dict[Ticket, None] = {}
+        self._running_by_model: Dict[str, int] = defaultdict(int)
+        self._running_by_client: Dict[str, int] = defaultdict(int)
+
+        # Totals for /scheduler, keyed by model hash and by client
+        self._served: Dict[str, Dict[str, Dict[str, float]]] = {
+            "models": defaultdict(lambda: {"served": 0, "wait_seconds": 0.0}),
+            "clients": defaultdict(lambda: {"served": 0, "wait_seconds": 0.0}),
+        }
+
+    def _weight(self, flow: FlowKey) -> float:
+        client = flow[1]
+        active = sum(1 for key in self._flows if key[1] == client) or 1
+        return self.client_weights.get(client, 1.0) / active
+
+    def submit(
+        self,
+        model_hash: str,
+        task: str,
+        client: str,
+        priority: str = "normal",
+        cost: Optional[float] = None,
+    ) -> Ticket:
+        """Queue a request; await ``ticket.granted`` before running it"""
+        cost = cost or DEFAULT_COST
+        flow = (priority, client, model_hash, task)
+        queue = self._flows.setdefault(flow, deque())
+        start = max(self._vtime, self._last_finish.get(flow, 0.0))
+        finish = start + cost / self._weight(flow)
+        self._last_finish[flow] = finish
+
+        ticket = Ticket(flow, cost, start, finish)
+        queue.append(ticket)
+        scheduler_queued.inc(priority=priority)
+        self._dispatch()
+        return ticket
+
+    def release(self, ticket: Ticket):
+        """Free a finished request's slot, or withdraw one still waiting"""
+        if ticket in self._running:
+            del self._running[ticket]
+            self._running_by_model[ticket.model_hash] -= 1
+            self._running_by_client[ticket.client] -= 1
+        else:
+            queue = self._flows.get(ticket.flow)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                scheduler_queued.dec(priority=ticket.priority)
+                if not queue:
+                    del self._flows[ticket.flow]
+            if not ticket.granted.done():
+                ticket.granted.cancel()
+        self._dispatch()
+
+    def _eligible(self, ticket: Ticket) -> bool:
+        if self.max_per_model and self._running_by_model[ticket.model_hash] >= self.max_per_model:
+            return False
+        if self.max_per_client and self._running_by_client[ticket.client] >= self.max_per_client:
+            return False
+        return True
+
+    def _pick(self) -> Optional[Ticket]:
+        """Head of the flow with the smallest start tag in the highest class that can run"""
+        for priority in PRIORITIES:
+            heads = [
+                queue[0]
+                for flow, queue in self._flows.items()
+                if flow[0] == priority and self._eligible(queue[0])
+            ]
+            if heads:
+                return min(heads, key=lambda t: (t.start, t.finish))
+        return None
+
+    def _dispatch(self):
+        while len(self._running) < self.concurrency:
+            ticket = self._pick()
+            if ticket is None:
+                break
+
+            queue = self._flows[ticket.flow]
+            queue.popleft()
+            if not queue:
+                del self._flows[ticket.flow]
+            scheduler_queued.dec(priority=ticket.priority)
+
+            self._vtime = max(self._vtime, ticket.start)
+            self._running[ticket] = None
+            self._running_by_model[ticket.model_hash] += 1
+            self._running_by_client[ticket.client] += 1
+
+            waited = time.monotonic() - ticket.enqueued_at
+            scheduler_wait.observe(waited, priority=ticket.priority, task=ticket.flow[3])
+            for group, key in (("models", ticket.model_hash), ("clients", ticket.client)):
+                self._served[group][key]["served"] += 1
+                self._served[group][key]["wait_seconds"] += waited
+            ticket.granted.set_result(None)
+
+        # Finish tags of idle flows at or behind virtual time no longer matter
+        for flow in [f for f, finish in self._last_finish.items() if finish <= self._vtime and f not in self._flows]:
+            del self._last_finish[flow]
+
+    def backlog(self, priority: str = "normal") -> float:
+        """Estimated seconds of work ahead of a new request at ``priority``"""
+        ahead = PRIORITIES[: PRIORITIES.index(priority) + 1]
+        work = sum(t.cost for t in self._running)
+        work += sum(t.cost for flow, queue in self._flows.items() if flow[0] in ahead for t in queue)
+        return work / self.concurrency
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        queues = [
+            {
+                "priority": priority,
+                "client": client,
+                "model_hash": model_hash,
+                "task": task,
+                "queued": len(queue),
+                "oldest_wait": now - queue[0].enqueued_at,
+            }
+            for (priority, client, model_hash, task), queue in self._flows.items()
+        ]
+
+        def summary(group: str, index: int, running: Dict[str, int]) -> Dict[str, Any]:
+            keys = set(self._served[group]) | {k for k, n in running.items() if n}
+            keys |= {flow[index] for flow in self._flows}
+            result = {}
+            for key in sorted(keys):
+                served = self._served[group].get(key, {"served": 0, "wait_seconds": 0.0})
+                result[key] = {
+                    "running": running.get(key, 0),
+                    "queued": sum(len(q) for f, q in self._flows.items() if f[index] == key),
+                    "served": served["served"],
+                    "mean_wait": served["wait_seconds"] / served["served"] if served["served"] else 0.0,
+                }
+            return result
+
+        return {
+            "concurrency": self.concurrency,
+            "max_per_model": self.max_per_model,
+            "max_per_client": self.max_per_client,
+            "running": len(self._running),
+            "queued": sum(len(q) for q in self._flows.values()),
+            "queues": queues,
+            "models": summary("models", 2, self._running_by_model),
+            "clients": summary("clients", 1, self._running_by_client),
+        }
+
+
+scheduler = Scheduler(
+    SCHEDULER_CONCURRENCY, MAX_INFLIGHT_PER_MODEL, MAX_INFLIGHT_PER_CLIENT, CLIENT_WEIGHTS
+)
@@ -26,11 +26,17 @@ class InferenceRequest(BaseModel):
     task: str
     input_text: str
     parameters: Optional[Dict[str, Any]] = Field(default_factory=dict)
+    precision: Optional[str] = None  # "fp32", "int8" or "bf16"; defaults to server config
+    engine: Optional[str] = None  # "torch" or "onnx"; defaults to server config
+    timeout: Optional[float] = Field(default=None, gt=0)  # Seconds; overrides X-Request-Timeout
+    priority: Optional[str] = None  # "high", "normal" or "low"; overrides X-Priority
 
 
 class ModelInfo(BaseModel):
     hash: str
     task: str
+    precision: Optional[str] = None
+    engine: Optional[str] = None
     status: Optional[str] = None
     cached: bool
     size_mb: Optional[float] = None
@@ -8,41 +8,180 @@ from fastapi import  HTTPException
 from logger import logger
 from .schema import (TextClassificationParams, TextGenerationParams,
                      ImageClassificationParams, SpeechRecognitionParams)
-from config import MODEL_CACHE_DIR, REQUEST_TIMEOUT, CACHE_MAX_MODELS, MAX_MODEL_SIZE
-from dehug import DeHugRepository, DeHugError, NetworkError, IPFSError
+from .metrics import (cache_hits, cache_misses, prefix_cache_lookups, prefix_cache_tokens,
+                      stage_timer)
+from .onnx_engine import ONNX_TASKS, to_onnx
+from .prefix_cache import PrefixCache
+from config import (LOCAL_MODEL_DIR, REQUEST_TIMEOUT, CACHE_MAX_MODELS,
+                    MAX_MODEL_SIZE, DEFAULT_PRECISION, MODEL_PRECISIONS, PRELOAD_CONCURRENCY,
+                    PREFIX_CACHE_MB, PREFIX_CACHE_MIN_TOKENS, DEFAULT_ENGINE, MODEL_ENGINES)
+from dehug import DeHugRepository, DeHugError, NetworkError, IPFSError, CIDNotDirectoryError
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
 import asyncio
+import importlib.util
+import json
+import threading
+import time
 import zipfile
 
+if TYPE_CHECKING:
+    from PIL import Image
+
 # Global model cache and DeHug repository client
 model_cache: Dict[str, Dict[str, Any]] = {}
 
+SUPPORTED_PRECISIONS = ("fp32", "int8", "bf16")
+SUPPORTED_ENGINES = ("torch", "onnx")
+# One lock per cache key so concurrent requests for a cold model load it once
+_load_locks: Dict[str, asyncio.Lock] = {}
+
+# Task each model hash was last loaded for, so popular models can be preloaded
+# for the right task after they've been unloaded
+model_tasks: Dict[str, str] = {}
+
+# Models present on disk, keyed by hash. Sizes are computed once when a model
+# is indexed so listing never has to walk the filesystem.
+disk_index: Dict[str, Dict[str, Any]] = {}
+
+# Startup preload progress, reported by /ready
+readiness: Dict[str, Any] = {
+    "ready": False,
+    "started_at": None,
+    "finished_at": None,
+    "loaded": [],
+    "failed": [],
+}
+QUANTIZABLE_TASKS = ("text-generation", "text-classification")
+
+# Recent inference time per model and task, used to reject requests that
+# can't meet their deadline. An exponentially weighted average, so a slow
+# cold first call is soon forgotten.
+service_times: Dict[str, float] = {}
+SERVICE_TIME_ALPHA = 0.3
+
+# Files each task needs from a directory CID; other weight formats (TF, Flax,
+# ONNX, GGUF) and docs are never downloaded
+WEIGHT_FILES = ["*.safetensors", "*.safetensors.index.json", "pytorch_model*.bin", "pytorch_model*.bin.index.json"]
+TOKENIZER_FILES = ["tokenizer*", "vocab*", "merges.txt", "special_tokens_map.json", "added_tokens.json", "*.model", "*.tiktoken"]
+TASK_FILE_PATTERNS = {
+    "text-generation": ["config.json", "generation_config.json", *TOKENIZER_FILES, *WEIGHT_FILES],
+    "text-classification": ["config.json", *TOKENIZER_FILES, *WEIGHT_FILES],
+    "image-classification": ["config.json", "preprocessor_config.json", *WEIGHT_FILES],
+    "speech-recognition": [
+        "config.json", "generation_config.json", "preprocessor_config.json", "normalizer.json",
+        *TOKENIZER_FILES, *WEIGHT_FILES,
+    ],
+}
+
 # Configuration for DeHugRepository
 dehug_config = {
     "ipfs_gateway": "https://gateway.pinata.cloud/ipfs",  # Replace with the actual base URL
     "request_timeout": 60,  # Timeout in seconds
+    "download_dir": LOCAL_MODEL_DIR,
 }
 dehug_repo = DeHugRepository(dehug_config)
 
-try:
-    from transformers import (
-        AutoTokenizer,
-        AutoModelForCausalLM,
-        AutoModelForSequenceClassification,
-        AutoModelForImageClassification,
-        AutoProcessor,
-        pipeline,
+# torch, transformers, PIL and numpy take seconds to import; they are imported
+# inside the functions that need them, so startup and /health stay fast and
+# each task only pays for its own dependencies on first use.
+HAS_TRANSFORMERS = all(
+    importlib.util.find_spec(module) is not None for module in ("transformers", "torch")
+)
+HAS_ONNXRUNTIME = importlib.util.find_spec("onnxruntime") is not None
+
+_import_lock = threading.Lock()
+# Whether the CPU has native bf16 kernels; None until torch has been imported
+_bf16_supported: Optional[bool] = None
+
+
+def import_ml_libraries():
+    """Import torch and transformers once, before model work runs in threads
+
+    Importing torch from several threads at once leaves it half initialized
+    ("generic_type: cannot initialize type ...") and every later load fails,
+    so the first import is serialized here. bf16 support is probed at the
+    same time, since that needs torch too.
+    """
+    global _bf16_supported
+    with _import_lock:
+        if _bf16_supported is not None:
+            return
+        import torch
+        from transformers import (  # noqa: F401
+            AutoModelForCausalLM,
+            AutoModelForImageClassification,
+            AutoModelForSequenceClassification,
+            AutoProcessor,
+            AutoTokenizer,
+            pipeline,
+        )
+
+        try:
+            _bf16_supported = bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+        except Exception:
+            _bf16_supported = False
+
+
+class RequestCancelled(Exception):
+    """Raised when a request's client disconnected or its deadline passed"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Request cancelled: {reason}")
+        self.reason = reason
+
+
+class CancelToken:
+    """Cooperative cancellation flag for one request
+
+    Set by the route when the client disconnects; the deadline (a
+    ``time.monotonic()`` value) cancels it on its own. Generation checks it
+    after every token, so a cancelled request frees the CPU within one step.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str):
+        if self.reason is None:
+            self.reason = reason
+
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.reason = "deadline"
+        return self.reason is not None
+
+    def check(self):
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+
+
+def cancel_criteria(token: CancelToken):
+    """StoppingCriteria that ends generate() as soon as the token is cancelled"""
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class Cancelled(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs) -> bool:
+            return token.cancelled
+
+    return StoppingCriteriaList([Cancelled()])
+
+
+def record_service_time(model_hash: str, task: str, seconds: float):
+    """Fold one completed inference (excluding model loading) into the estimate"""
+    key = f"{model_hash}_{task}"
+    previous = service_times.get(key)
+    service_times[key] = (
+        seconds if previous is None else previous + SERVICE_TIME_ALPHA * (seconds - previous)
     )
-    import torch
-    from PIL import Image
-    import librosa
-    import numpy as np
 
-    HAS_TRANSFORMERS = True
-except ImportError:
-    HAS_TRANSFORMERS = False
+
+def estimate_service_time(model_hash: str, task: str) -> float:
+    """Recent inference time for this model; 0 if it has never been run"""
+    return service_times.get(f"{model_hash}_{task}", 0.0)
 
 
 def get_model_size(model_path: Path) -> float:
@@ -54,6 +193,33 @@ def get_model_size(model_path: Path) -> float:
     return total_size / (1024 * 1024)
 
 
+def index_disk_model(model_hash: str, model_path: Path, size_mb: Optional[float] = None):
+    """Record a model directory in the disk index"""
+    if size_mb is None:
+        size_mb = get_model_size(model_path)
+    disk_index[model_hash] = {"path": str(model_path), "size_mb": size_mb}
+
+
+def forget_disk_model(model_hash: str):
+    """Drop a model directory from the disk index"""
+    disk_index.pop(model_hash, None)
+
+
+def scan_disk_cache():
+    """Index every model directory already in LOCAL_MODEL_DIR (run once at startup)
+
+    The SDK keeps its index, archives and metadata there too; only
+    directories with a config.json are models.
+    """
+    cache_dir = Path(LOCAL_MODEL_DIR)
+    if not cache_dir.exists():
+        return
+    for model_dir in cache_dir.iterdir():
+        if (model_dir / "config.json").is_file() and model_dir.name not in disk_index:
+            index_disk_model(model_dir.name, model_dir)
+    logger.info(f"Indexed {len(disk_index)} models on disk")
+
+
 def cleanup_old_models():
     """Remove least recently used models if cache is full"""
     if len(model_cache) <= CACHE_MAX_MODELS:
@@ -76,11 +242,141 @@ def cleanup_old_models():
                 if model_path.exists():
                     shutil.rmtree(model_path)
                     logger.info(f"Cleaned up model files at {model_path}")
+                forget_disk_model(model_obj["hash"])
             except Exception as e:
                 logger.warning(f"Failed to clean up model files: {e}")
 
 
-async def load_model(model_hash: str, task: str) -> Dict[str, Any]:
+def extract_zip(zip_path: Path, extract_dir: Path):
+    """Extract a downloaded model archive"""
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        zip_ref.extractall(extract_dir)
+
+
+def resolve_precision(model_hash: str, task: str, precision: Optional[str] = None) -> str:
+    """Pick the weight precision for a model, falling back to fp32 where unsupported"""
+    precision = precision or MODEL_PRECISIONS.get(model_hash) or DEFAULT_PRECISION
+
+    if precision not in SUPPORTED_PRECISIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported precision: {precision}. Choose one of {list(SUPPORTED_PRECISIONS)}",
+        )
+
+    if precision != "fp32" and task not in QUANTIZABLE_TASKS:
+        logger.info(f"Precision {precision} not available for {task}, using fp32")
+        return "fp32"
+
+    if precision == "bf16" and not bf16_supported():
+        logger.warning("bf16 not supported on this CPU, using fp32")
+        return "fp32"
+
+    return precision
+
+
+def bf16_supported() -> bool:
+    """Whether the CPU has native bf16 kernels, as probed by import_ml_libraries"""
+    return bool(_bf16_supported)
+
+
+def resolve_engine(
+    model_hash: str, task: str, precision: str, engine: Optional[str] = None
+) -> str:
+    """Pick the execution engine for a model, falling back to torch where ONNX can't serve it"""
+    engine = (
+        engine
+        or MODEL_ENGINES.get(f"{model_hash}:{task}")
+        or MODEL_ENGINES.get(model_hash)
+        or DEFAULT_ENGINE
+    )
+
+    if engine not in SUPPORTED_ENGINES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported engine: {engine}. Choose one of {list(SUPPORTED_ENGINES)}",
+        )
+    if engine == "torch":
+        return engine
+
+    if task not in ONNX_TASKS:
+        logger.info(f"ONNX engine not available for {task}, using torch")
+        return "torch"
+    if precision != "fp32":
+        logger.info(f"ONNX engine serves fp32 models only, using torch for {precision}")
+        return "torch"
+    if not HAS_ONNXRUNTIME:
+        logger.warning("onnxruntime not installed, using torch")
+        return "torch"
+    return engine
+
+
+def get_cache_key(model_hash: str, task: str, precision: str = "fp32", engine: str = "torch") -> str:
+    """Build the model_cache key for a model loaded at a given precision and engine"""
+    key = f"{model_hash}_{task}_{precision}"
+    return key if engine == "torch" else f"{key}_{engine}"
+
+
+def apply_precision(model, precision: str):
+    """Convert a loaded torch model to the requested precision"""
+    import torch
+
+    if precision == "int8":
+        # Dynamic quantization: int8 weights for Linear layers, activations quantized on the fly
+        return torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    if precision == "bf16":
+        return model.to(torch.bfloat16)
+    return model
+
+
+def load_model_from_path(model_path: Path, task: str, precision: str = "fp32") -> Dict[str, Any]:
+    """Load model weights for a task from a local directory"""
+    if task == "text-generation":
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+
+        tokenizer = AutoTokenizer.from_pretrained(str(model_path))
+        model = AutoModelForCausalLM.from_pretrained(str(model_path))
+        model = apply_precision(model.eval(), precision)
+
+        # Ensure tokenizer has pad_token
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        prefix_cache = PrefixCache(PREFIX_CACHE_MB * 1024 * 1024, PREFIX_CACHE_MIN_TOKENS)
+        return {"tokenizer": tokenizer, "model": model, "prefix_cache": prefix_cache}
+
+    elif task == "text-classification":
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        tokenizer = AutoTokenizer.from_pretrained(str(model_path))
+        model = AutoModelForSequenceClassification.from_pretrained(str(model_path))
+        model = apply_precision(model.eval(), precision)
+
+        return {"tokenizer": tokenizer, "model": model}
+
+    elif task == "image-classification":
+        from transformers import AutoProcessor, AutoModelForImageClassification
+
+        processor = AutoProcessor.from_pretrained(str(model_path))
+        model = AutoModelForImageClassification.from_pretrained(str(model_path))
+
+        return {"processor": processor, "model": model}
+
+    elif task == "speech-recognition":
+        from transformers import pipeline
+
+        # Use pipeline for speech recognition (Whisper-like models)
+        pipe = pipeline("automatic-speech-recognition", model=str(model_path))
+
+        return {"pipeline": pipe}
+
+    raise HTTPException(status_code=400, detail=f"Unsupported task: {task}")
+
+
+async def load_model(
+    model_hash: str, task: str, precision: Optional[str] = None, engine: Optional[str] = None
+) -> Dict[str, Any]:
     """Load model into memory using DeHug SDK"""
     if not HAS_TRANSFORMERS:
         raise HTTPException(
@@ -88,32 +384,115 @@ async def load_model(model_hash: str, task: str) -> Dict[str, Any]:
             detail="Transformers library not installed. Please install: pip install transformers torch",
         )
 
-    cache_key = f"{model_hash}_{task}"
+    # Off the event loop, and before resolve_precision needs the bf16 probe
+    if _bf16_supported is None:
+        try:
+            await asyncio.to_thread(import_ml_libraries)
+        except Exception as e:
+            logger.error(f"Failed to import torch/transformers: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to load model: {str(e)}")
+
+    precision = resolve_precision(model_hash, task, precision)
+    engine = resolve_engine(model_hash, task, precision, engine)
+    cache_key = get_cache_key(model_hash, task, precision, engine)
 
     if cache_key in model_cache:
         model_cache[cache_key]["last_used"] = datetime.now()
+        cache_hits.inc(task=task, model_hash=model_hash)
         logger.info(f"Using cached model {cache_key}")
         return model_cache[cache_key]
 
+    lock = _load_locks.setdefault(cache_key, asyncio.Lock())
+    async with lock:
+        # Another request may have finished loading while we waited
+        if cache_key in model_cache:
+            model_cache[cache_key]["last_used"] = datetime.now()
+            cache_hits.inc(task=task, model_hash=model_hash)
+            return model_cache[cache_key]
+        cache_misses.inc(task=task, model_hash=model_hash)
+        return await _load_model_uncached(model_hash, task, precision, engine, cache_key)
+
+
+def download_marker(model_dir: Path, task: Optional[str] = None) -> Path:
+    """File recording that a task's files (or, without a task, a whole archive) are on disk"""
+    return model_dir / f".dehug-complete-{task or 'archive'}"
+
+
+def download_complete(model_dir: Path, task: str) -> bool:
+    return download_marker(model_dir, task).exists() or download_marker(model_dir).exists()
+
+
+def download_started(model_dir: Path) -> Path:
+    """File recording that a download into model_dir was attempted"""
+    return model_dir / ".dehug-downloading"
+
+
+def has_download_state(model_dir: Path) -> bool:
+    """Whether any download ever touched model_dir, finished or not"""
+    return any(
+        path.name.startswith(".dehug-") or path.name.endswith(".partial")
+        for path in model_dir.rglob("*")
+    )
+
+
+async def download_model_files(model_hash: str, task: str, local_model: Path) -> Path:
+    """Fetch the files a task needs into local_model and mark them complete
+
+    Files already present (fetched for another task, or before a failed
+    download) are skipped, so only the missing ones are downloaded.
+    """
     try:
-        # Use DeHug SDK to download model from IPFS
-        local_model = Path("/tmp/dehug") / f"{model_hash}"
-        if local_model.exists():
-            logger.info(f"Found existing model for hash {model_hash} at {local_model}, skipping download")
-            model_path = local_model
-        else:
-            logger.info(f"Downloading model {model_hash} using DeHug SDK")
+        # Directory CID: fetch only the files this task needs, in parallel
+        local_model.mkdir(parents=True, exist_ok=True)
+        download_started(local_model).touch()
+        with stage_timer("download", task, model_hash):
+            model_path = await asyncio.to_thread(
+                dehug_repo.download_directory,
+                model_hash,
+                str(local_model),
+                TASK_FILE_PATTERNS.get(task),
+            )
+        logger.info(f"Model directory {model_hash} downloaded to {model_path}")
+    except CIDNotDirectoryError:
+        with stage_timer("download", task, model_hash):
             model_path = await asyncio.to_thread(dehug_repo.load_model, model_hash)
 
+        logger.info(f"Model {model_hash} downloaded to {model_path}")
+
+        # Unzip model is in a zip file
+        extract_dir = model_path.parent / model_path.stem
+        logger.info(f"Extracting model zip to {extract_dir}")
+        with stage_timer("unzip", task, model_hash):
+            await asyncio.to_thread(extract_zip, model_path, extract_dir)
+        download_marker(extract_dir).touch()
+        return extract_dir
 
-            logger.info(f"Model {model_hash} downloaded to {model_path}")
+    download_marker(model_path, task).touch()
+    return model_path
 
-            # Unzip model is in a zip file
-            extract_dir = model_path.parent / model_path.stem
-            logger.info(f"Extracting model zip to {extract_dir}")
-            with zipfile.ZipFile(model_path, "r") as zip_ref:
-                zip_ref.extractall(extract_dir)
-            model_path = extract_dir    
+
+async def _load_model_uncached(
+    model_hash: str, task: str, precision: str, engine: str, cache_key: str
+) -> Dict[str, Any]:
+    try:
+        # Use DeHug SDK to download model from IPFS
+        local_model = Path(LOCAL_MODEL_DIR) / f"{model_hash}"
+        if download_complete(local_model, task):
+            logger.info(f"Found complete model for hash {model_hash} at {local_model}, skipping download")
+            model_path = local_model
+        else:
+            # Placed there by hand, rather than left behind by an interrupted download
+            hand_placed = local_model.is_dir() and not has_download_state(local_model)
+            logger.info(f"Downloading model {model_hash} using DeHug SDK")
+            try:
+                model_path = await download_model_files(model_hash, task, local_model)
+            except (DeHugError, NetworkError, IPFSError) as e:
+                if not hand_placed:
+                    raise
+                # No CID to fetch from: adopt it as is, so later loads skip IPFS
+                logger.warning(f"Could not download {model_hash} ({e}), using existing files at {local_model}")
+                model_path = local_model
+                download_marker(model_path, task).touch()
 
         # Check model size
         model_size = get_model_size(model_path)
@@ -126,78 +505,39 @@ async def load_model(model_hash: str, task: str) -> Dict[str, Any]:
         # Clean up old models if needed
         # cleanup_old_models()
 
-        model_obj = {}
-
         # Load model based on task
-        if task == "text-generation":
-            tokenizer = AutoTokenizer.from_pretrained(str(model_path))
-            model = AutoModelForCausalLM.from_pretrained(str(model_path))
-
-            # Ensure tokenizer has pad_token
-            if tokenizer.pad_token is None:
-                tokenizer.pad_token = tokenizer.eos_token
-
-            model_obj = {
-                "tokenizer": tokenizer,
-                "model": model,
-                "task": task,
-                "loaded_at": datetime.now(),
-                "last_used": datetime.now(),
-                "path": str(model_path),
-                "size_mb": model_size,
-            }
-
-        elif task == "text-classification":
-            tokenizer = AutoTokenizer.from_pretrained(str(model_path))
-            model = AutoModelForSequenceClassification.from_pretrained(str(model_path))
-
-            model_obj = {
-                "tokenizer": tokenizer,
-                "model": model,
-                "task": task,
-                "loaded_at": datetime.now(),
-                "last_used": datetime.now(),
-                "path": str(model_path),
-                "size_mb": model_size,
-            }
-
-        elif task == "image-classification":
-            processor = AutoProcessor.from_pretrained(str(model_path))
-            model = AutoModelForImageClassification.from_pretrained(str(model_path))
-
-            model_obj = {
-                "processor": processor,
-                "model": model,
-                "task": task,
-                "loaded_at": datetime.now(),
-                "last_used": datetime.now(),
-                "path": str(model_path),
-                "size_mb": model_size,
-            }
-
-        elif task == "speech-recognition":
-            # Use pipeline for speech recognition (Whisper-like models)
-            pipe = pipeline("automatic-speech-recognition", model=str(model_path))
-
-            model_obj = {
-                "pipeline": pipe,
+        with stage_timer("load", task, model_hash):
+            model_obj = await asyncio.to_thread(
+                load_model_from_path, model_path, task, precision
+            )
+        if engine == "onnx":
+            with stage_timer("onnx_export", task, model_hash):
+                if not await asyncio.to_thread(to_onnx, model_obj, model_path, model_hash, task):
+                    engine = "torch"
+        model_obj.update(
+            {
+                "hash": model_hash,
                 "task": task,
+                "precision": precision,
+                "engine": engine,
                 "loaded_at": datetime.now(),
                 "last_used": datetime.now(),
                 "path": str(model_path),
                 "size_mb": model_size,
             }
-
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported task: {task}")
+        )
 
         logger.info(f"Model {cache_key} loaded and cached successfully")
 
         # Cache the model
         model_cache[cache_key] = model_obj
+        model_tasks[model_hash] = task
+        index_disk_model(model_hash, model_path, model_size)
 
         return model_obj
 
+    except HTTPException:
+        raise
     except (DeHugError, NetworkError, IPFSError) as e:
         logger.error(f"DeHug SDK error loading model {model_hash}: {e}")
         raise HTTPException(
@@ -208,39 +548,176 @@ async def load_model(model_hash: str, task: str) -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail=f"Failed to load model: {str(e)}")
 
 
+def read_preload_manifest(manifest_path: str) -> List[Dict[str, Any]]:
+    """Read the list of (model_hash, task[, precision[, engine]]) entries to preload"""
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+
+    entries = []
+    for entry in manifest:
+        if isinstance(entry, (list, tuple)):
+            entry = dict(zip(("model_hash", "task", "precision", "engine"), entry))
+        entries.append(entry)
+    return entries
+
+
+def warm_up_model(model_obj: Dict[str, Any]):
+    """Run a dummy forward pass so the first real request doesn't pay kernel warm-up"""
+    import torch
+
+    task = model_obj["task"]
+
+    with torch.no_grad():
+        if task == "text-generation":
+            tokenizer = model_obj["tokenizer"]
+            inputs = tokenizer("Hello", return_tensors="pt")
+            model_obj["model"].generate(
+                inputs["input_ids"],
+                attention_mask=inputs.get("attention_mask"),
+                max_new_tokens=2,
+                pad_token_id=tokenizer.eos_token_id,
+            )
+
+        elif task == "text-classification":
+            inputs = model_obj["tokenizer"]("Hello", return_tensors="pt")
+            model_obj["model"](
+                input_ids=inputs["input_ids"], attention_mask=inputs.get("attention_mask")
+            )
+
+        elif task == "image-classification":
+            from PIL import Image
+
+            image = Image.new("RGB", (224, 224))
+            inputs = model_obj["processor"](image, return_tensors="pt")
+            model_obj["model"](**inputs)
+
+        elif task == "speech-recognition":
+            import numpy as np
+
+            model_obj["pipeline"](np.zeros(16000, dtype=np.float32))
+
+
+async def preload_models(entries: List[Dict[str, Any]]):
+    """Load and warm up models in parallel, then mark the server ready"""
+    readiness["started_at"] = datetime.now()
+    semaphore = asyncio.Semaphore(PRELOAD_CONCURRENCY)
+
+    async def preload(entry: Dict[str, Any]):
+        async with semaphore:
+            try:
+                model_obj = await load_model(
+                    entry["model_hash"], entry["task"], entry.get("precision"), entry.get("engine")
+                )
+                await asyncio.to_thread(warm_up_model, model_obj)
+                readiness["loaded"].append(entry)
+                logger.info(f"Preloaded {entry['model_hash']} for {entry['task']}")
+            except Exception as e:
+                error = getattr(e, "detail", str(e))
+                readiness["failed"].append({**entry, "error": error})
+                logger.error(f"Failed to preload {entry['model_hash']}: {error}")
+
+    await asyncio.gather(*(preload(entry) for entry in entries))
+
+    readiness["finished_at"] = datetime.now()
+    readiness["ready"] = True
+    logger.info(
+        f"Preload finished: {len(readiness['loaded'])} loaded, {len(readiness['failed'])} failed"
+    )
+
+
+def prefill(model, prefix_cache: PrefixCache, input_ids, attention_mask=None):
+    """Compute key/values for all but the last prompt token, reusing a cached prefix
+
+    Returns the key/values to resume generate() from and how many prompt
+    tokens came from the cache. The new key/values are cached for later
+    prompts. ``input_ids`` holds a single prompt.
+    """
+    import torch
+
+    tokens = input_ids[0]
+    reused, past = prefix_cache.lookup(tokens)
+    if reused < len(tokens) - 1:
+        with torch.no_grad():
+            outputs = model(
+                input_ids=input_ids[:, reused:-1],
+                attention_mask=attention_mask[:, :-1] if attention_mask is not None else None,
+                past_key_values=past,
+                use_cache=True,
+            )
+        past = outputs.past_key_values
+        prefix_cache.insert(tokens[:-1], past)
+    return past, reused
+
+
 async def run_text_generation(
-    model_obj: Dict[str, Any], input_text: str, params: TextGenerationParams
+    model_obj: Dict[str, Any],
+    input_text: str,
+    params: TextGenerationParams,
+    token: Optional[CancelToken] = None,
 ) -> Dict[str, Any]:
-    """Run text generation inference"""
+    """Run text generation inference, stopping early if ``token`` is cancelled"""
+    import torch
+
     tokenizer = model_obj["tokenizer"]
     model = model_obj["model"]
+    task, model_hash = model_obj["task"], model_obj["hash"]
 
     # Tokenize input
-    inputs = tokenizer(input_text, return_tensors="pt", padding=True, truncation=True)
-
-    # Generate
-    with torch.no_grad():
-        outputs = model.generate(
-            inputs["input_ids"],
-            attention_mask=inputs.get("attention_mask"),
-            max_length=len(inputs["input_ids"][0]) + params.max_length,
-            temperature=params.temperature,
-            top_p=params.top_p,
-            top_k=params.top_k,
-            do_sample=params.do_sample,
-            pad_token_id=tokenizer.eos_token_id,
+    with stage_timer("tokenize", task, model_hash):
+        inputs = tokenizer(input_text, return_tensors="pt", padding=True, truncation=True)
+
+    past_key_values, reused = None, 0
+    prefix_cache = model_obj.get("prefix_cache")
+    if (
+        prefix_cache is not None
+        and prefix_cache.enabled
+        and inputs["input_ids"].shape[0] == 1
+        and inputs["input_ids"].shape[1] > prefix_cache.min_tokens
+    ):
+        with stage_timer("prefill", task, model_hash):
+            past_key_values, reused = await asyncio.to_thread(
+                prefill, model, prefix_cache, inputs["input_ids"], inputs.get("attention_mask")
+            )
+        prefix_cache_lookups.inc(model_hash=model_hash, result="hit" if reused else "miss")
+        prefix_cache_tokens.inc(reused, model_hash=model_hash, kind="reused")
+        prefix_cache_tokens.inc(
+            inputs["input_ids"].shape[1] - reused, model_hash=model_hash, kind="computed"
         )
 
+    def generate():
+        with torch.no_grad():
+            return model.generate(
+                inputs["input_ids"],
+                attention_mask=inputs.get("attention_mask"),
+                past_key_values=past_key_values,
+                max_length=len(inputs["input_ids"][0]) + params.max_length,
+                temperature=params.temperature,
+                top_p=params.top_p,
+                top_k=params.top_k,
+                do_sample=params.do_sample,
+                pad_token_id=tokenizer.eos_token_id,
+                stopping_criteria=cancel_criteria(token) if token is not None else None,
+            )
+
+    # Generate off the event loop so disconnects are noticed while it runs
+    with stage_timer("forward", task, model_hash):
+        outputs = await asyncio.to_thread(generate)
+    if token is not None:
+        token.check()
+
     # Decode output
-    generated_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
+    with stage_timer("decode", task, model_hash):
+        full_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
 
     # Remove input text from output
+    generated_text = full_text
     if generated_text.startswith(input_text):
         generated_text = generated_text[len(input_text) :].strip()
 
     return {
         "generated_text": generated_text,
-        "full_text": tokenizer.decode(outputs[0], skip_special_tokens=True),
+        "full_text": full_text,
+        "cached_prompt_tokens": reused,
         "parameters_used": params.dict(),
     }
 
@@ -249,33 +726,42 @@ async def run_text_classification(
     model_obj: Dict[str, Any], input_text: str, params: TextClassificationParams
 ) -> Dict[str, Any]:
     """Run text classification inference"""
+    import torch
+
     tokenizer = model_obj["tokenizer"]
     model = model_obj["model"]
+    task, model_hash = model_obj["task"], model_obj["hash"]
 
     # Tokenize input
-    inputs = tokenizer(
-        input_text,
-        return_tensors="pt",
-        padding=True,
-        truncation=True,
-        max_length=params.max_length,
-    )
+    with stage_timer("tokenize", task, model_hash):
+        inputs = tokenizer(
+            input_text,
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=params.max_length,
+        )
 
-    # Run inference
-    with torch.no_grad():
-        outputs = model(**inputs)
-        predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
+    def forward():
+        with torch.no_grad():
+            outputs = model(**inputs)
+            return torch.nn.functional.softmax(outputs.logits, dim=-1)
 
-    # Get label names if available
-    if hasattr(model.config, "id2label"):
-        labels = [model.config.id2label[i] for i in range(len(predictions[0]))]
-    else:
-        labels = [f"LABEL_{i}" for i in range(len(predictions[0]))]
+    # Run inference off the event loop so other scheduled requests can proceed
+    with stage_timer("forward", task, model_hash):
+        predictions = await asyncio.to_thread(forward)
 
-    # Create results
-    scores = predictions[0].tolist()
-    results = [{"label": label, "score": score} for label, score in zip(labels, scores)]
-    results.sort(key=lambda x: x["score"], reverse=True)
+    with stage_timer("decode", task, model_hash):
+        # Get label names if available
+        if hasattr(model.config, "id2label"):
+            labels = [model.config.id2label[i] for i in range(len(predictions[0]))]
+        else:
+            labels = [f"LABEL_{i}" for i in range(len(predictions[0]))]
+
+        # Create results
+        scores = predictions[0].tolist()
+        results = [{"label": label, "score": score} for label, score in zip(labels, scores)]
+        results.sort(key=lambda x: x["score"], reverse=True)
 
     if params.return_all_scores:
         return {
@@ -293,17 +779,21 @@ async def run_text_classification(
 
 
 async def run_image_classification(
-    model_obj: Dict[str, Any], image: Image.Image, params: ImageClassificationParams
+    model_obj: Dict[str, Any], image: "Image.Image", params: ImageClassificationParams
 ) -> Dict[str, Any]:
     """Run image classification inference"""
+    import torch
+
     processor = model_obj["processor"]
     model = model_obj["model"]
+    task, model_hash = model_obj["task"], model_obj["hash"]
 
     # Process image
-    inputs = processor(image, return_tensors="pt")
+    with stage_timer("preprocess", task, model_hash):
+        inputs = processor(image, return_tensors="pt")
 
     # Run inference
-    with torch.no_grad():
+    with stage_timer("forward", task, model_hash), torch.no_grad():
         outputs = model(**inputs)
         predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
 
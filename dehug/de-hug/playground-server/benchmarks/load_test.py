@@ -0,0 +1,285 @@
+"""
+Load test the inference API with a configurable request mix
+
+Drives /infer and /infer-with-files through DeHugInferenceClient at a fixed
+concurrency and writes throughput, latency percentiles and error rates as JSON,
+so results can be diffed between releases.
+
+Usage (from the playground-server directory, server running):
+    python -m benchmarks.tiny_models          # once, on the server host
+    python -m benchmarks.load_test --concurrency 16 --requests 500 --output run.json
+    python -m benchmarks.load_test --mix mix.json --baseline run.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import platform
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from client import DeHugInferenceClient
+
+# Default mix against the models created by benchmarks.tiny_models
+DEFAULT_MIX = [
+    {
+        "name": "text-generation",
+        "task": "text-generation",
+        "model_hash": "tiny-text-generation",
+        "input_text": "once upon a time the quick brown fox",
+        "parameters": {"max_length": 20, "do_sample": False},
+        "weight": 2,
+    },
+    {
+        "name": "text-classification",
+        "task": "text-classification",
+        "model_hash": "tiny-text-classification",
+        "input_text": "i love this product it works great",
+        "parameters": {},
+        "weight": 3,
+    },
+    {
+        "name": "image-classification",
+        "task": "image-classification",
+        "model_hash": "tiny-image-classification",
+        "parameters": {"top_k": 3, "confidence_threshold": 0.1},
+        "weight": 1,
+    },
+]
+
+
+def blank_image() -> bytes:
+    """Small generated PNG used when an image scenario has no file"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color=(120, 80, 200)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def prepare_mix(mix: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fill in defaults and read any scenario files up front"""
+    prepared = []
+    for scenario in mix:
+        scenario = {"weight": 1, "parameters": {}, **scenario}
+        scenario.setdefault("name", f"{scenario['task']}:{scenario['model_hash']}")
+
+        if scenario["task"] in ("image-classification", "speech-recognition"):
+            if "file" in scenario:
+                path = Path(scenario["file"])
+                scenario["file_name"] = path.name
+                scenario["file_bytes"] = path.read_bytes()
+            else:
+                scenario["file_name"] = "image.png"
+                scenario["file_bytes"] = blank_image()
+            scenario.setdefault(
+                "content_type",
+                "image/png" if scenario["task"] == "image-classification" else "audio/wav",
+            )
+        prepared.append(scenario)
+    return prepared
+
+
+async def send(client: DeHugInferenceClient, scenario: Dict[str, Any]) -> Dict[str, Any]:
+    """Send one request and return a latency sample"""
+    start = time.perf_counter()
+    error = None
+    server_time = None
+    try:
+        if "file_bytes" in scenario:
+            response = await client.infer_with_file(
+                scenario["model_hash"],
+                scenario["task"],
+                scenario["file_name"],
+                scenario["file_bytes"],
+                scenario["content_type"],
+                **scenario["parameters"],
+            )
+        else:
+            response = await client.infer(
+                {
+                    "model_hash": scenario["model_hash"],
+                    "task": scenario["task"],
+                    "input_text": scenario["input_text"],
+                    "parameters": scenario["parameters"],
+                    "precision": scenario.get("precision"),
+                }
+            )
+        body = response.json()
+        server_time = body.get("processing_time")
+        if response.status_code != 200:
+            error = f"HTTP {response.status_code}"
+        elif not body.get("success"):
+            error = body.get("error") or "unsuccessful response"
+    except Exception as e:
+        error = type(e).__name__
+
+    return {
+        "scenario": scenario["name"],
+        "latency": time.perf_counter() - start,
+        "server_time": server_time,
+        "error": error,
+    }
+
+
+async def run_load_test(
+    client: DeHugInferenceClient,
+    mix: List[Dict[str, Any]],
+    total_requests: int,
+    concurrency: int,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """Send total_requests picked from the weighted mix with fixed concurrency"""
+    rng = random.Random(seed)
+    schedule = rng.choices(mix, weights=[s["weight"] for s in mix], k=total_requests)
+    queue: asyncio.Queue = asyncio.Queue()
+    for scenario in schedule:
+        queue.put_nowait(scenario)
+
+    samples = []
+
+    async def worker():
+        while not queue.empty():
+            scenario = queue.get_nowait()
+            samples.append(await send(client, scenario))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: List[Dict[str, Any]], wall_time: float) -> Dict[str, Any]:
+    latencies = [s["latency"] * 1000 for s in samples if not s["error"]]
+    server_times = [s["server_time"] * 1000 for s in samples if s["server_time"] is not None]
+    errors: Dict[str, int] = {}
+    for sample in samples:
+        if sample["error"]:
+            errors[sample["error"]] = errors.get(sample["error"], 0) + 1
+
+    return {
+        "requests": len(samples),
+        "errors": sum(errors.values()),
+        "error_rate": sum(errors.values()) / len(samples) if samples else 0.0,
+        "error_types": errors,
+        "throughput_rps": len(latencies) / wall_time if wall_time else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+        },
+        "server_time_ms": {
+            "p50": percentile(server_times, 50),
+            "p95": percentile(server_times, 95),
+            "p99": percentile(server_times, 99),
+        },
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change of throughput and latency percentiles against a baseline run"""
+
+    def delta(new, old):
+        if new is None or not old:
+            return None
+        return (new - old) / old
+
+    changes = {}
+    sections = {"overall": report["overall"], **report["scenarios"]}
+    base_sections = {"overall": baseline["overall"], **baseline.get("scenarios", {})}
+    for name, section in sections.items():
+        base = base_sections.get(name)
+        if not base:
+            continue
+        changes[name] = {
+            "throughput_rps": delta(section["throughput_rps"], base["throughput_rps"]),
+            "error_rate": section["error_rate"] - base["error_rate"],
+            **{
+                f"latency_{p}": delta(section["latency_ms"][p], base["latency_ms"][p])
+                for p in ("p50", "p95", "p99")
+            },
+        }
+    return changes
+
+
+async def main_async(args) -> Dict[str, Any]:
+    mix = DEFAULT_MIX
+    if args.mix:
+        mix = json.loads(Path(args.mix).read_text())
+    mix = prepare_mix(mix)
+
+    async with DeHugInferenceClient(
+        args.url, timeout=args.timeout, max_connections=args.concurrency
+    ) as client:
+        health = await client.health_check()
+
+        if args.warmup:
+            # One request per scenario so cold model loads don't skew the numbers
+            await asyncio.gather(*(send(client, scenario) for scenario in mix))
+
+        start = time.perf_counter()
+        samples = await run_load_test(
+            client, mix, args.requests, args.concurrency, args.seed
+        )
+        wall_time = time.perf_counter() - start
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "url": args.url,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "seed": args.seed,
+            "wall_time_s": wall_time,
+            "transformers_version": health.get("transformers_version"),
+            "python": platform.python_version(),
+        },
+        "overall": summarize(samples, wall_time),
+        "scenarios": {
+            scenario["name"]: summarize(
+                [s for s in samples if s["scenario"] == scenario["name"]], wall_time
+            )
+            for scenario in mix
+        },
+    }
+
+    if args.baseline:
+        report["vs_baseline"] = compare(report, json.loads(Path(args.baseline).read_text()))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--mix", help="JSON file with a list of request scenarios")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--baseline", help="Previous report to compare against")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
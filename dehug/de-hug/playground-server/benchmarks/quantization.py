@@ -0,0 +1,177 @@
+"""
+Benchmark latency, memory and accuracy of reduced-precision model loading
+
+Loads a local model directory at each precision through the same code path
+as the inference server and compares it against the fp32 baseline.
+
+Usage (from the playground-server directory):
+    python -m benchmarks.quantization --model-dir ./tiny-gpt2 --task text-generation
+"""
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import torch
+
+from app.services import SUPPORTED_PRECISIONS, load_model_from_path, resolve_precision
+
+DEFAULT_INPUTS = [
+    "Once upon a time",
+    "The quick brown fox jumps over the lazy dog",
+    "I love this product, it works exactly as described!",
+    "This was the worst experience I have ever had.",
+    "Decentralized storage keeps models available forever.",
+]
+
+
+def model_memory_mb(model) -> float:
+    """Size of parameters, buffers and packed quantized weights in MB"""
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    # Dynamically quantized layers keep their weights in packed params, not parameters()
+    for module in model.modules():
+        packed = getattr(module, "_packed_params", None)
+        if packed is not None and hasattr(packed, "_weight_bias"):
+            weight, bias = packed._weight_bias()
+            total += weight.numel() * weight.element_size()
+            if bias is not None:
+                total += bias.numel() * bias.element_size()
+    return total / (1024 * 1024)
+
+
+def forward_logits(model_obj: Dict[str, Any], task: str, text: str) -> torch.Tensor:
+    """Run a single forward pass and return fp32 logits for the last position"""
+    tokenizer = model_obj["tokenizer"]
+    model = model_obj["model"]
+    inputs = tokenizer(text, return_tensors="pt")
+    with torch.no_grad():
+        logits = model(
+            input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"]
+        ).logits
+    if task == "text-generation":
+        logits = logits[:, -1, :]
+    return logits[0].float()
+
+
+def run_inference(model_obj: Dict[str, Any], task: str, text: str, max_new_tokens: int):
+    """Run the same work a request would: generate or classify"""
+    if task == "text-classification":
+        return forward_logits(model_obj, task, text)
+
+    tokenizer = model_obj["tokenizer"]
+    inputs = tokenizer(text, return_tensors="pt")
+    with torch.no_grad():
+        return model_obj["model"].generate(
+            inputs["input_ids"],
+            attention_mask=inputs["attention_mask"],
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id,
+        )
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def benchmark_precision(
+    model_dir: Path, task: str, precision: str, inputs: List[str], runs: int, max_new_tokens: int
+) -> Dict[str, Any]:
+    start = time.perf_counter()
+    model_obj = load_model_from_path(model_dir, task, precision)
+    load_time = time.perf_counter() - start
+
+    # Warm up kernels before timing
+    run_inference(model_obj, task, inputs[0], max_new_tokens)
+
+    latencies = []
+    for _ in range(runs):
+        for text in inputs:
+            start = time.perf_counter()
+            run_inference(model_obj, task, text, max_new_tokens)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "model_obj": model_obj,
+        "load_time_s": load_time,
+        "memory_mb": model_memory_mb(model_obj["model"]),
+        "latency_ms": {
+            "mean": statistics.mean(latencies),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+        },
+    }
+
+
+def accuracy_delta(
+    baseline: Dict[str, Any], candidate: Dict[str, Any], task: str, inputs: List[str]
+) -> Dict[str, float]:
+    """Compare candidate outputs against the fp32 baseline"""
+    agreements = 0
+    max_prob_diff = 0.0
+    for text in inputs:
+        base_probs = torch.softmax(forward_logits(baseline["model_obj"], task, text), dim=-1)
+        cand_probs = torch.softmax(forward_logits(candidate["model_obj"], task, text), dim=-1)
+        agreements += int(base_probs.argmax() == cand_probs.argmax())
+        max_prob_diff = max(max_prob_diff, (base_probs - cand_probs).abs().max().item())
+
+    return {
+        "top1_agreement": agreements / len(inputs),
+        "max_prob_diff": max_prob_diff,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-dir", required=True, type=Path)
+    parser.add_argument(
+        "--task", required=True, choices=["text-generation", "text-classification"]
+    )
+    parser.add_argument("--precisions", default=",".join(SUPPORTED_PRECISIONS))
+    parser.add_argument("--inputs", type=Path, help="Text file with one input per line")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-new-tokens", type=int, default=20)
+    parser.add_argument("--output", type=Path, help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    inputs = DEFAULT_INPUTS
+    if args.inputs:
+        inputs = [line for line in args.inputs.read_text().splitlines() if line.strip()]
+
+    results = {}
+    for requested in args.precisions.split(","):
+        precision = resolve_precision(str(args.model_dir), args.task, requested)
+        if precision != requested:
+            print(f"Skipping {requested}: not supported here")
+            continue
+        results[precision] = benchmark_precision(
+            args.model_dir, args.task, precision, inputs, args.runs, args.max_new_tokens
+        )
+
+    report = {"task": args.task, "model_dir": str(args.model_dir), "precisions": {}}
+    baseline = results.get("fp32")
+    for precision, result in results.items():
+        entry = {key: value for key, value in result.items() if key != "model_obj"}
+        if baseline and precision != "fp32":
+            entry["accuracy_vs_fp32"] = accuracy_delta(baseline, result, args.task, inputs)
+            entry["speedup_vs_fp32"] = (
+                baseline["latency_ms"]["mean"] / result["latency_ms"]["mean"]
+            )
+            entry["memory_ratio_vs_fp32"] = result["memory_mb"] / baseline["memory_mb"]
+        report["precisions"][precision] = entry
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Measure cold-start cost: module import time and time until the server answers
+
+Every measurement runs in a fresh interpreter so nothing is already imported.
+Reports the median over --runs of:
+  - import time of the dehug SDK and of the server app (main)
+  - which heavy modules (torch, transformers, ...) importing main pulled in
+  - wall time from launching uvicorn until /health (and /ready) respond
+
+Usage (from the playground-server directory):
+    python -m benchmarks.startup --runs 5 --output startup.json
+    python -m benchmarks.startup --baseline startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+HEAVY_MODULES = ["torch", "transformers", "PIL", "numpy", "librosa", "pyarrow", "pandas", "requests"]
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(module: str) -> Dict[str, Any]:
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_server(timeout: float) -> Dict[str, Optional[float]]:
+    """Seconds from process launch until /health, then /ready, return 200"""
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    timings: Dict[str, Optional[float]] = {"health_s": None, "ready_s": None}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1) as client:
+            for endpoint in ("health", "ready"):
+                while time.perf_counter() - start < timeout:
+                    try:
+                        if client.get(f"/{endpoint}").status_code == 200:
+                            timings[f"{endpoint}_s"] = time.perf_counter() - start
+                            break
+                    except httpx.HTTPError:
+                        pass
+                    if process.poll() is not None:
+                        return timings
+                    time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait(10)
+    return timings
+
+
+def median(values: List[Optional[float]]) -> Optional[float]:
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for the server")
+    parser.add_argument("--skip-server", action="store_true", help="Only measure imports")
+    parser.add_argument("--baseline", help="Previous report to compare against")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "runs": args.runs,
+            "preload_manifest": os.getenv("DEHUG_PRELOAD_MANIFEST"),
+            "python": platform.python_version(),
+        },
+        "imports": {},
+    }
+
+    for module in ("dehug", "main"):
+        samples = [measure_import(module) for _ in range(args.runs)]
+        report["imports"][module] = {
+            "median_s": median([s["seconds"] for s in samples]),
+            "heavy_modules_loaded": samples[-1]["loaded"],
+        }
+
+    if not args.skip_server:
+        samples = [measure_server(args.timeout) for _ in range(args.runs)]
+        report["server"] = {
+            "health_median_s": median([s["health_s"] for s in samples]),
+            "ready_median_s": median([s["ready_s"] for s in samples]),
+        }
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        report["vs_baseline"] = {
+            **{
+                f"import_{module}": _delta(section["median_s"], baseline["imports"].get(module, {}).get("median_s"))
+                for module, section in report["imports"].items()
+            },
+            **{
+                key: _delta(value, baseline.get("server", {}).get(key))
+                for key, value in report.get("server", {}).items()
+            },
+        }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+
+
+def _delta(new, old):
+    if new is None or not old:
+        return None
+    return (new - old) / old
+
+
+if __name__ == "__main__":
+    main()
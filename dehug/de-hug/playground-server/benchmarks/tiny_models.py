@@ -0,0 +1,123 @@
+"""
+Create tiny randomly initialised models for benchmarking without IPFS
+
+Models are written to LOCAL_MODEL_DIR/<name>, where the server picks them up
+as if they had already been downloaded.
+
+Usage (from the playground-server directory):
+    python -m benchmarks.tiny_models
+"""
+
+import argparse
+from pathlib import Path
+from typing import Dict
+
+from config import LOCAL_MODEL_DIR
+
+TINY_MODELS = {
+    "tiny-text-generation": "text-generation",
+    "tiny-text-classification": "text-classification",
+    "tiny-image-classification": "image-classification",
+}
+
+VOCAB_WORDS = (
+    "the a an and or but is are was were be to of in on for with as at by from this that "
+    "it i you we they he she love hate good bad great terrible product works model data "
+    "once upon time quick brown fox jumps over lazy dog hello world"
+).split()
+
+
+def build_tokenizer():
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    special = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "<eos>"]
+    vocab = {word: i for i, word in enumerate(dict.fromkeys(special + VOCAB_WORDS))}
+    tokenizer = Tokenizer(models.WordLevel(vocab=vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        unk_token="[UNK]",
+        pad_token="[PAD]",
+        cls_token="[CLS]",
+        sep_token="[SEP]",
+        eos_token="<eos>",
+    )
+
+
+def create_tiny_models(target_dir: Path) -> Dict[str, Path]:
+    """Write one tiny model per task and return their paths"""
+    from transformers import (
+        BertConfig,
+        BertForSequenceClassification,
+        GPT2Config,
+        GPT2LMHeadModel,
+        ViTConfig,
+        ViTForImageClassification,
+        ViTImageProcessor,
+    )
+
+    tokenizer = build_tokenizer()
+    vocab_size = len(tokenizer)
+    paths = {}
+
+    path = target_dir / "tiny-text-generation"
+    GPT2LMHeadModel(
+        GPT2Config(
+            vocab_size=vocab_size,
+            n_embd=64,
+            n_layer=2,
+            n_head=2,
+            n_positions=1024,
+            eos_token_id=tokenizer.eos_token_id,
+        )
+    ).save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    paths["tiny-text-generation"] = path
+
+    path = target_dir / "tiny-text-classification"
+    BertForSequenceClassification(
+        BertConfig(
+            vocab_size=vocab_size,
+            hidden_size=64,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=128,
+            num_labels=2,
+            id2label={0: "NEGATIVE", 1: "POSITIVE"},
+            label2id={"NEGATIVE": 0, "POSITIVE": 1},
+        )
+    ).save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    paths["tiny-text-classification"] = path
+
+    path = target_dir / "tiny-image-classification"
+    ViTForImageClassification(
+        ViTConfig(
+            image_size=32,
+            patch_size=8,
+            hidden_size=32,
+            num_hidden_layers=1,
+            num_attention_heads=2,
+            intermediate_size=64,
+            num_labels=3,
+        )
+    ).save_pretrained(path)
+    ViTImageProcessor(size={"height": 32, "width": 32}).save_pretrained(path)
+    paths["tiny-image-classification"] = path
+
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target-dir", type=Path, default=Path(LOCAL_MODEL_DIR))
+    args = parser.parse_args()
+
+    for name, path in create_tiny_models(args.target_dir).items():
+        print(f"{name} ({TINY_MODELS[name]}): {path}")
+
+
+if __name__ == "__main__":
+    main()
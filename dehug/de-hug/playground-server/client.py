@@ -8,82 +8,124 @@ import asyncio
 from pathlib import Path
 
 class DeHugInferenceClient:
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        timeout: float = 300,
+        max_connections: int = 100,
+    ):
         self.base_url = base_url
-        
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared HTTP client so connections are pooled across calls"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
     async def health_check(self):
         """Check if the server is healthy"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{self.base_url}/health")
-            return response.json()
+        response = await self.client.get(f"{self.base_url}/health")
+        return response.json()
     
     async def list_models(self):
         """List cached models"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{self.base_url}/models")
-            return response.json()
+        response = await self.client.get(f"{self.base_url}/models")
+        return response.json()
+
+    async def infer(self, payload: dict) -> httpx.Response:
+        """POST a raw payload to /infer"""
+        return await self.client.post(f"{self.base_url}/infer", json=payload)
+
+    async def infer_with_file(
+        self, model_hash: str, task: str, filename: str, content: bytes,
+        content_type: str, **params
+    ) -> httpx.Response:
+        """POST file contents to /infer-with-files"""
+        return await self.client.post(
+            f"{self.base_url}/infer-with-files",
+            params={
+                "model_hash": model_hash,
+                "task": task,
+                "parameters": json.dumps(params),
+            },
+            files={"file": (filename, content, content_type)},
+        )
     
-    async def text_generation(self, model_hash: str, input_text: str, **params):
+    async def text_generation(
+        self, model_hash: str, input_text: str, precision: str = None, timeout: float = None, priority: str = None, engine: str = None, **params
+    ):
         """Run text generation"""
         payload = {
             "model_hash": model_hash,
             "task": "text-generation",
             "input_text": input_text,
-            "parameters": params
+            "parameters": params,
+            "precision": precision,
+            "timeout": timeout,
+            "priority": priority,
+            "engine": engine,
         }
         
-        async with httpx.AsyncClient(timeout=300) as client:
-            response = await client.post(f"{self.base_url}/infer", json=payload)
-            return response.json()
+        response = await self.infer(payload)
+        return response.json()
     
-    async def text_classification(self, model_hash: str, input_text: str, **params):
+    async def text_classification(
+        self, model_hash: str, input_text: str, precision: str = None, timeout: float = None, priority: str = None, engine: str = None, **params
+    ):
         """Run text classification"""
         payload = {
             "model_hash": model_hash,
             "task": "text-classification", 
             "input_text": input_text,
-            "parameters": params
+            "parameters": params,
+            "precision": precision,
+            "timeout": timeout,
+            "priority": priority,
+            "engine": engine,
         }
         
-        async with httpx.AsyncClient(timeout=300) as client:
-            response = await client.post(f"{self.base_url}/infer", json=payload)
-            return response.json()
+        response = await self.infer(payload)
+        return response.json()
     
     async def image_classification(self, model_hash: str, image_path: str, **params):
         """Run image classification"""
-        with open(image_path, 'rb') as f:
-            files = {'file': f}
-            data = {
-                'model_hash': model_hash,
-                'task': 'image-classification',
-                'parameters': json.dumps(params)
-            }
-            
-            async with httpx.AsyncClient(timeout=300) as client:
-                response = await client.post(
-                    f"{self.base_url}/infer-with-files",
-                    files=files,
-                    data=data
-                )
-                return response.json()
+        path = Path(image_path)
+        response = await self.infer_with_file(
+            model_hash, "image-classification", path.name, path.read_bytes(),
+            "image/jpeg", **params
+        )
+        return response.json()
     
     async def speech_recognition(self, model_hash: str, audio_path: str, **params):
         """Run speech recognition"""
-        with open(audio_path, 'rb') as f:
-            files = {'file': f}
-            data = {
-                'model_hash': model_hash,
-                'task': 'speech-recognition',
-                'parameters': json.dumps(params)
-            }
-            
-            async with httpx.AsyncClient(timeout=300) as client:
-                response = await client.post(
-                    f"{self.base_url}/infer-with-files",
-                    files=files,
-                    data=data
-                )
-                return response.json()
+        path = Path(audio_path)
+        response = await self.infer_with_file(
+            model_hash, "speech-recognition", path.name, path.read_bytes(),
+            "audio/wav", **params
+        )
+        return response.json()
 
 # Example usage
 async def main():
@@ -131,5 +173,7 @@ async def main():
     models = await client.list_models()
     print(json.dumps(models, indent=2))
 
+    await client.aclose()
+
 if __name__ == "__main__":
     asyncio.run(main())
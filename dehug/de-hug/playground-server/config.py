@@ -1,11 +1,66 @@
+import json
 import os
 
 IPFS_GATEWAY = "https://gateway.pinata.cloud/ipfs"
 MODEL_CACHE_DIR = "/tmp/dehug_models"
+# Where the DeHug SDK downloads and extracts models; a directory named after a
+# model hash here is used as-is without touching IPFS
+LOCAL_MODEL_DIR = os.getenv("DEHUG_LOCAL_MODEL_DIR", "/tmp/dehug")
 MAX_MODEL_SIZE = 5 * 1024 * 1024 * 1024  # 5GB
-REQUEST_TIMEOUT = 300  # 5 minutes
+REQUEST_TIMEOUT = 300  # 5 minutes; default deadline for /infer requests that don't set one
+# How often an in-flight request checks whether its client has gone away
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DEHUG_DISCONNECT_POLL_INTERVAL", "0.1"))
 ALLOWED_ORIGINS = ["*"]  # TODO: restrict for production
 CACHE_MAX_MODELS = 5 # Maximum number of models to cache
 
+# Weight precision used when loading models: "fp32", "int8" (dynamic quantization) or "bf16"
+DEFAULT_PRECISION = os.getenv("DEHUG_DEFAULT_PRECISION", "fp32")
+# Per-model overrides, e.g. '{"QmHash": "int8"}'
+MODEL_PRECISIONS = json.loads(os.getenv("DEHUG_MODEL_PRECISIONS", "{}"))
+
+# Inference slots shared by all models, and caps on how many of them one model
+# or one client (X-Client-Id header, else IP address) may hold; 0 means no cap
+SCHEDULER_CONCURRENCY = int(os.getenv("DEHUG_SCHEDULER_CONCURRENCY", "2"))
+MAX_INFLIGHT_PER_MODEL = int(os.getenv("DEHUG_MAX_INFLIGHT_PER_MODEL", "0"))
+MAX_INFLIGHT_PER_CLIENT = int(os.getenv("DEHUG_MAX_INFLIGHT_PER_CLIENT", "0"))
+# Fair-share weights per client, e.g. '{"batch-jobs": 0.25, "frontend": 4}'; default 1
+CLIENT_WEIGHTS = json.loads(os.getenv("DEHUG_CLIENT_WEIGHTS", "{}"))
+
+# Attention key/values kept per text-generation model for reusing prompt
+# prefixes (0 disables), and the shortest prefix worth reusing
+PREFIX_CACHE_MB = int(os.getenv("DEHUG_PREFIX_CACHE_MB", "256"))
+PREFIX_CACHE_MIN_TOKENS = int(os.getenv("DEHUG_PREFIX_CACHE_MIN_TOKENS", "32"))
+
+# Execution engine: "torch", or "onnx" to serve text/image classification with
+# ONNX Runtime on CPU. Per-model overrides are keyed by "<hash>" or "<hash>:<task>",
+# e.g. '{"QmHash:text-classification": "onnx"}'
+DEFAULT_ENGINE = os.getenv("DEHUG_DEFAULT_ENGINE", "torch")
+MODEL_ENGINES = json.loads(os.getenv("DEHUG_MODEL_ENGINES", "{}"))
+# Intra-op threads per ONNX Runtime session; by default the cores are split
+# between the scheduler's concurrent slots
+ONNX_THREADS = int(
+    os.getenv("DEHUG_ONNX_THREADS", str(max((os.cpu_count() or 1) // SCHEDULER_CONCURRENCY, 1)))
+)
+# Where models are exported to ONNX, as <hash>/<task>.onnx
+ONNX_CACHE_DIR = os.getenv("DEHUG_ONNX_CACHE_DIR", "/tmp/dehug_onnx")
+
+# JSON file listing models to load and warm up before reporting ready,
+# e.g. [{"model_hash": "Qm...", "task": "text-generation", "precision": "int8"}]
+PRELOAD_MANIFEST = os.getenv("DEHUG_PRELOAD_MANIFEST")
+PRELOAD_CONCURRENCY = int(os.getenv("DEHUG_PRELOAD_CONCURRENCY", "2"))
+
+# Where to read model popularity from: the tracker's stats endpoint (e.g.
+# "http://tracker:8000/track/stats") or a local JSON file in the same shape,
+# {"<hash>": {"total": 42}}, or a list of {"model_hash", "task", "downloads"}
+POPULARITY_SOURCE = os.getenv("DEHUG_POPULARITY_SOURCE")
+POPULARITY_INTERVAL = float(os.getenv("DEHUG_POPULARITY_INTERVAL", "300"))
+# How many of the most downloaded models to keep loaded ahead of demand
+PRELOAD_TOP_N = int(os.getenv("DEHUG_PRELOAD_TOP_N", "3"))
+# Memory (MemAvailable) to leave free when preloading
+PRELOAD_MEMORY_HEADROOM_MB = int(os.getenv("DEHUG_PRELOAD_MEMORY_HEADROOM_MB", "1024"))
+# Unload models not used for this many seconds, unless they are in the top N.
+# Off (0) unless set, e.g. 1800
+IDLE_UNLOAD_TTL = float(os.getenv("DEHUG_IDLE_UNLOAD_TTL", "0"))
+
 # Ensure cache dir exists
 os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
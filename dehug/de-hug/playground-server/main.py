@@ -1,7 +1,10 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import router
-from config import ALLOWED_ORIGINS
+from app.services import preload_models, read_preload_manifest, readiness, scan_disk_cache
+from app.popularity import popularity_loop
+from config import ALLOWED_ORIGINS, IDLE_UNLOAD_TTL, POPULARITY_SOURCE, PRELOAD_MANIFEST
 
 app = FastAPI(
     title="DeHug Inference API",
@@ -21,6 +24,31 @@ app.add_middleware(
 # Include routes
 app.include_router(router)
 
+background_tasks = set()
+
+
+@app.on_event("startup")
+async def start_preload():
+    """Preload models from the manifest in the background; /ready reports when done"""
+    await asyncio.to_thread(scan_disk_cache)
+
+    if POPULARITY_SOURCE or IDLE_UNLOAD_TTL > 0:
+        start_background(popularity_loop())
+
+    if not PRELOAD_MANIFEST:
+        readiness["ready"] = True
+        return
+
+    entries = read_preload_manifest(PRELOAD_MANIFEST)
+    start_background(preload_models(entries))
+
+
+def start_background(coro):
+    """Run a coroutine for the lifetime of the app, keeping a reference to it"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
 
 if __name__ == "__main__":
     import uvicorn
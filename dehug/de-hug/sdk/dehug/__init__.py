@@ -1,4 +1,5 @@
-from .exceptions import DeHugError, NetworkError, IPFSError
+from .exceptions import DeHugError, NetworkError, IPFSError, CIDNotDirectoryError
+from .datasets import load_dataset_from_cid
 from .repository import DeHugRepository
 from .utils import load_content_from_cid
 
@@ -10,6 +11,7 @@ __all__ = [
     "DeHugError",
     "NetworkError",
     "IPFSError",
+    "CIDNotDirectoryError",
     "load_dataset_from_cid",
     "load_content_from_cid",
 ]
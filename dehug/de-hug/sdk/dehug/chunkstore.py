@@ -0,0 +1,361 @@
+"""Content-defined chunk store that deduplicates downloads of related blobs"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .exceptions import IPFSError, NetworkError
+
+logger = logging.getLogger("dehug.chunkstore")
+
+# Chunk boundaries fall where a rolling hash of the last WINDOW bytes has its
+# low bits zero, so an insertion only changes the chunks around it and the
+# rest of a fine-tuned model lines up with its base model's chunks.
+WINDOW = 48
+AVG_CHUNK = 1 << 20
+MIN_CHUNK = 256 << 10
+MAX_CHUNK = 4 << 20
+SEGMENT = 8 << 20  # Bytes hashed per numpy pass, bounding memory use
+
+# Name of the per-directory file that publishes recipes for its files
+CHUNK_MANIFEST = ".dehug-chunks.json"
+
+# (sha256, offset, length)
+Chunk = Tuple[str, int, int]
+
+_gear_table = None
+
+
+def _table():
+    global _gear_table
+    if _gear_table is None:
+        import numpy as np
+
+        # Fixed seed: boundaries must be identical on every machine
+        _gear_table = np.random.default_rng(0x0DE4).integers(0, 1 << 32, 256, dtype=np.uint32)
+    return _gear_table
+
+
+def _candidates(path: Path, mask: int) -> Iterator[int]:
+    """Yield offsets (end positions) where the windowed hash matches ``mask``
+
+    The hash at i is the sum of table[byte] over the WINDOW bytes ending at i
+    (mod 2^32), computed for a whole segment at once as a difference of
+    cumulative sums; uint32 wraparound does the modulo for free.
+    """
+    import numpy as np
+
+    table = _table()
+    size = path.stat().st_size
+    if size == 0:
+        return
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    for start in range(0, size, SEGMENT):
+        lo = max(start - WINDOW, 0)
+        values = table[data[lo : start + SEGMENT]]
+        sums = np.zeros(len(values) + 1, dtype=np.uint32)
+        np.cumsum(values, dtype=np.uint32, out=sums[1:])
+        ends = np.arange(start - lo + 1, len(values) + 1)
+        window = sums[ends] - sums[np.maximum(ends - WINDOW, 0)]
+        hits = np.nonzero((window & np.uint32(mask)) == 0)[0]
+        for hit in hits:
+            yield start + int(hit) + 1
+    del data
+
+
+def chunk_boundaries(path: Path, avg: int = AVG_CHUNK, min_size: int = MIN_CHUNK, max_size: int = MAX_CHUNK) -> List[Tuple[int, int]]:
+    """Split a file into (offset, length) chunks at content-defined boundaries"""
+    size = path.stat().st_size
+    mask = avg - 1
+    chunks, offset = [], 0
+    for end in _candidates(path, mask):
+        while end - offset > max_size:
+            chunks.append((offset, max_size))
+            offset += max_size
+        if end - offset >= min_size:
+            chunks.append((offset, end - offset))
+            offset = end
+    while size - offset > max_size:
+        chunks.append((offset, max_size))
+        offset += max_size
+    if size > offset:
+        chunks.append((offset, size - offset))
+    return chunks
+
+
+def chunk_file(path: str) -> Dict:
+    """Compute the recipe of a file: its size and (sha256, offset, length) chunks"""
+    path = Path(path)
+    chunks: List[Chunk] = []
+    with open(path, "rb") as f:
+        for offset, length in chunk_boundaries(path):
+            f.seek(offset)
+            chunks.append((hashlib.sha256(f.read(length)).hexdigest(), offset, length))
+    return {"size": path.stat().st_size, "chunks": chunks}
+
+
+def write_chunk_manifest(directory: str) -> Path:
+    """Write recipes for every file in a directory before uploading it
+
+    Clients that already hold some of the chunks then fetch only the missing
+    byte ranges of each file. A recipe is only found through this manifest,
+    so files uploaded as single-file CIDs are always downloaded whole.
+    """
+    root = Path(directory)
+    recipes = {
+        path.relative_to(root).as_posix(): chunk_file(path)
+        for path in sorted(root.rglob("*"))
+        if path.is_file() and path.name != CHUNK_MANIFEST
+    }
+    manifest = root / CHUNK_MANIFEST
+    manifest.write_text(json.dumps(recipes))
+    return manifest
+
+
+class ChunkStore:
+    """Stores each blob once and indexes it by content-defined chunks
+
+    Layout under ``root``: ``blobs/<cid>`` holds a downloaded blob and
+    ``recipes/<cid>.json`` lists its (sha256, offset, length) chunks in order.
+    A chunk is read back from whichever stored blob contains it, so a related
+    version only downloads the byte ranges of chunks no stored blob has.
+    Blobs are stored whole, so the saving is in bytes downloaded: related
+    versions still take their full size on disk each.
+
+    Targets are hardlinks to the stored blob where the filesystem allows (a
+    copy otherwise), so a download takes its size on disk once. Writing to a
+    downloaded file changes the stored blob; reused chunks are checked against
+    their sha256, and a blob that no longer matches is dropped from the index.
+    """
+
+    def __init__(self, root: str, max_workers: int = 8, max_range: int = 16 << 20):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.recipe_dir = self.root / "recipes"
+        self.max_workers = max_workers
+        self.max_range = max_range
+        self._lock = threading.Lock()
+        # sha256 -> (cid, offset, length) of one stored copy; built on first use
+        self._chunks: Optional[Dict[str, Tuple[str, int, int]]] = None
+
+    def blob_path(self, cid: str) -> Path:
+        return self.blob_dir / cid
+
+    def _index(self) -> Dict[str, Tuple[str, int, int]]:
+        with self._lock:
+            if self._chunks is None:
+                self._chunks = {}
+                if self.recipe_dir.exists():
+                    for path in self.recipe_dir.glob("*.json"):
+                        cid = path.stem
+                        if self.blob_path(cid).exists():
+                            self._add_to_index(cid, json.loads(path.read_text()))
+            return self._chunks
+
+    def _add_to_index(self, cid: str, recipe: Dict):
+        for digest, offset, length in recipe["chunks"]:
+            self._chunks.setdefault(digest, (cid, offset, length))
+
+    def has_chunk(self, digest: str) -> bool:
+        return digest in self._index()
+
+    def recipe(self, cid: str) -> Optional[Dict]:
+        path = self.recipe_dir / f"{cid}.json"
+        if not path.exists() or not self.blob_path(cid).exists():
+            return None
+        return json.loads(path.read_text())
+
+    def read_chunk(self, digest: str) -> bytes:
+        cid, offset, length = self._index()[digest]
+        with open(self.blob_path(cid), "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        if hashlib.sha256(data).hexdigest() != digest:
+            # The blob was modified through one of its hardlinks
+            self._forget(cid)
+            raise IPFSError(f"Stored blob {cid} no longer matches its recipe")
+        return data
+
+    def _forget(self, cid: str):
+        """Stop reusing chunks of a stored blob"""
+        (self.recipe_dir / f"{cid}.json").unlink(missing_ok=True)
+        with self._lock:
+            self._chunks = None
+
+    @staticmethod
+    def _verify(path: Path, recipe: Dict):
+        """Check every chunk of ``path`` against ``recipe``"""
+        if path.stat().st_size != recipe["size"]:
+            raise IPFSError(f"{path.name} has the wrong size")
+        with open(path, "rb") as f:
+            for digest, offset, length in recipe["chunks"]:
+                f.seek(offset)
+                if hashlib.sha256(f.read(length)).hexdigest() != digest:
+                    raise IPFSError(f"Chunk at offset {offset} of {path.name} failed verification")
+
+    def _write_recipe(self, cid: str, recipe: Dict):
+        self.recipe_dir.mkdir(parents=True, exist_ok=True)
+        path = self.recipe_dir / f"{cid}.json"
+        partial = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.partial")
+        partial.write_text(json.dumps(recipe))
+        os.replace(partial, path)
+        self._index()
+        with self._lock:
+            self._add_to_index(cid, recipe)
+
+    @staticmethod
+    def _link(source: Path, target: Path):
+        """Hardlink ``source`` at ``target``, copying where links aren't possible"""
+        if target.exists() and os.path.samefile(source, target):
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.partial")
+        try:
+            os.link(source, partial)
+        except OSError:
+            # Different filesystem, or one without hardlinks
+            shutil.copyfile(source, partial)
+        os.replace(partial, target)
+
+    def put_file(self, cid: str, path: str) -> Dict[str, int]:
+        """Add a downloaded file to the store; returns new vs already stored bytes"""
+        recipe = chunk_file(path)
+        index = self._index()
+        stats = {"new_bytes": 0, "reused_bytes": 0}
+        for digest, _, length in recipe["chunks"]:
+            stats["reused_bytes" if digest in index else "new_bytes"] += length
+        self._link(Path(path), self.blob_path(cid))
+        self._write_recipe(cid, recipe)
+        return stats
+
+    def materialize(self, cid: str, target: str) -> Path:
+        """Place a stored blob at ``target``"""
+        if self.recipe(cid) is None:
+            raise IPFSError(f"CID {cid} is not in the chunk store")
+        target = Path(target)
+        self._link(self.blob_path(cid), target)
+        return target
+
+    def _ranges(self, missing: List[Chunk]) -> List[List[Chunk]]:
+        """Group adjacent missing chunks so each group is one Range request"""
+        groups: List[List[Chunk]] = []
+        for chunk in sorted(missing, key=lambda c: c[1]):
+            if groups:
+                last = groups[-1]
+                start = last[0][1]
+                end = last[-1][1] + last[-1][2]
+                if chunk[1] == end and end + chunk[2] - start <= self.max_range:
+                    last.append(chunk)
+                    continue
+            groups.append([chunk])
+        return groups
+
+    def _fetch_range(self, session, url: str, group: List[Chunk], out_path: Path) -> int:
+        """Download one group of chunks and write them at their offsets in ``out_path``"""
+        import requests
+
+        start = group[0][1]
+        end = group[-1][1] + group[-1][2] - 1
+        try:
+            response = session.get(url, headers={"Range": f"bytes={start}-{end}"}, timeout=60)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise NetworkError(f"Failed to fetch byte range {start}-{end}: {e}")
+        if response.status_code != 206:
+            raise NetworkError("Gateway ignored the Range request")
+
+        data = response.content
+        for digest, offset, length in group:
+            piece = data[offset - start : offset - start + length]
+            if hashlib.sha256(piece).hexdigest() != digest:
+                raise IPFSError(f"Chunk at offset {offset} failed verification")
+        with open(out_path, "r+b") as out:
+            out.seek(start)
+            out.write(data)
+        return end - start + 1
+
+    def _assemble(self, cid: str, url: str, recipe: Dict) -> int:
+        """Build ``blobs/<cid>`` from stored chunks plus ranged downloads; returns bytes fetched"""
+        index = self._index()
+        # Several chunks of one blob can share a digest; fetch it once
+        fetched_at: Dict[str, int] = {}
+        for digest, offset, length in recipe["chunks"]:
+            if digest not in index and digest not in fetched_at:
+                fetched_at[digest] = offset
+        unique = [tuple(c) for c in recipe["chunks"] if fetched_at.get(c[0]) == c[1]]
+
+        blob = self.blob_path(cid)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        partial = blob.with_name(f"{cid}.{os.getpid()}.{threading.get_ident()}.partial")
+        try:
+            # Stored chunks first, so a modified blob is caught before any download
+            with open(partial, "wb") as out:
+                out.truncate(recipe["size"])
+                for digest, offset, length in recipe["chunks"]:
+                    if digest not in fetched_at:
+                        out.seek(offset)
+                        out.write(self.read_chunk(digest))
+
+            import requests
+
+            with requests.Session() as session, ThreadPoolExecutor(self.max_workers) as pool:
+                fetched = sum(
+                    pool.map(lambda g: self._fetch_range(session, url, g, partial), self._ranges(unique))
+                )
+
+            with open(partial, "r+b") as out:
+                for digest, offset, length in recipe["chunks"]:
+                    if digest in fetched_at and fetched_at[digest] != offset:
+                        out.seek(fetched_at[digest])
+                        data = out.read(length)
+                        out.seek(offset)
+                        out.write(data)
+            self._verify(partial, recipe)
+            os.replace(partial, blob)
+        finally:
+            partial.unlink(missing_ok=True)
+        return fetched
+
+    def fetch(self, cid: str, target: str, gateway: str, recipe: Optional[Dict] = None) -> Path:
+        """Download ``cid`` to ``target`` through the store
+
+        With a recipe (from a directory's published chunk manifest), only byte
+        ranges of chunks no stored blob has are requested. Without one the
+        whole blob is downloaded, then indexed so later related versions that
+        do have a recipe can reuse its chunks.
+        """
+        from .utils import download_to_file
+
+        if self.recipe(cid) is not None:
+            return self.materialize(cid, target)
+
+        if recipe is not None:
+            try:
+                fetched = self._assemble(cid, f"{gateway.rstrip('/')}/{cid}", recipe)
+                self._write_recipe(cid, recipe)
+                total = recipe["size"]
+                logger.info(
+                    f"Fetched {fetched} of {total} bytes for {cid}; {total - fetched} reused from the chunk store"
+                )
+                return self.materialize(cid, target)
+            except (NetworkError, IPFSError, OSError) as e:
+                logger.warning(f"Ranged fetch of {cid} failed ({e}), downloading it whole")
+
+        path = download_to_file(cid, target, gateway)
+        stats = self.put_file(cid, str(path))
+        logger.info(
+            f"Stored {cid}: {stats['new_bytes']} new bytes, {stats['reused_bytes']} already stored"
+        )
+        return path
+
+    def usage(self) -> Dict[str, int]:
+        """Bytes of stored blobs vs bytes of distinct chunk content among them"""
+        index = self._index()
+        stored = sum(p.stat().st_size for p in self.blob_dir.glob("*") if not p.name.endswith(".partial"))
+        return {"stored_bytes": stored, "unique_bytes": sum(c[2] for c in index.values())}
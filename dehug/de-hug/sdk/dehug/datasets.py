@@ -0,0 +1,401 @@
+"""Format-aware dataset loading backed by memory-mapped Arrow files"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .exceptions import DeHugError, DatasetNotFoundError
+from .utils import download_to_file, load_content_from_cid, open_ipfs_stream
+
+logger = logging.getLogger("dehug.datasets")
+
+TABULAR_FORMATS = ("parquet", "csv", "jsonl", "json")
+FORMAT_ALIASES = {"pq": "parquet", "ndjson": "jsonl", "tsv": "csv"}
+OUTPUTS = ("pandas", "arrow", "dataset")
+DEFAULT_BATCH_SIZE = 10000
+CSV_BLOCK_SIZE = 1 << 20  # Bytes parsed per CSV block while streaming
+
+# Filters are either a pyarrow expression or DNF tuples, e.g. [("label", "=", 1)]
+Filters = Union[Any, List[Tuple[str, str, Any]], List[List[Tuple[str, str, Any]]]]
+
+
+def normalize_format(format_hint: Optional[str]) -> Optional[str]:
+    if not format_hint:
+        return None
+    format_hint = format_hint.lower().lstrip(".")
+    return FORMAT_ALIASES.get(format_hint, format_hint)
+
+
+def detect_format(path: Path, format_hint: Optional[str] = None) -> str:
+    """Use the hint if given, otherwise sniff the first bytes of the file"""
+    format_hint = normalize_format(format_hint)
+    with open(path, "rb") as f:
+        head = f.read(4096)
+
+    if head.startswith(b"PAR1"):
+        return "parquet"
+    if format_hint:
+        if format_hint == "json" and head.lstrip().startswith(b"{"):
+            # A JSON object per line is JSONL; a single object is not tabular
+            return "jsonl" if b"\n{" in head.strip() else "json"
+        return format_hint
+
+    stripped = head.lstrip()
+    if stripped.startswith(b"{"):
+        return "jsonl"
+    if stripped.startswith(b"["):
+        return "json"
+    return "csv"
+
+
+def _csv_options(format_hint: Optional[str]):
+    from pyarrow import csv
+
+    delimiter = "\t" if (format_hint or "").lower().lstrip(".") == "tsv" else ","
+    return csv.ParseOptions(delimiter=delimiter)
+
+
+def convert_to_arrow(source: Path, target: Path, data_format: str, format_hint: Optional[str] = None):
+    """Write ``source`` as an uncompressed Arrow IPC file so it can be memory-mapped
+
+    Parquet and CSV are converted batch by batch, so the whole dataset is never
+    held in memory. The file is written next to the target and renamed into
+    place, so a crash never leaves a partial cache entry.
+    """
+    import pyarrow as pa
+
+    if data_format == "parquet":
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(source)
+        schema, batches = parquet_file.schema_arrow, parquet_file.iter_batches()
+    elif data_format == "csv":
+        from pyarrow import csv
+
+        reader = csv.open_csv(source, parse_options=_csv_options(format_hint))
+        schema, batches = reader.schema, reader
+    elif data_format == "jsonl":
+        from pyarrow import json as pa_json
+
+        table = pa_json.read_json(source)
+        schema, batches = table.schema, table.to_batches()
+    elif data_format == "json":
+        with open(source, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        if not isinstance(records, list):
+            raise DeHugError("JSON dataset must be an array of records to load as a table")
+        table = pa.Table.from_pylist(records)
+        schema, batches = table.schema, table.to_batches()
+    else:
+        raise DeHugError(f"Unsupported tabular format: {data_format}")
+
+    partial = target.with_suffix(f".{os.getpid()}.partial")
+    with pa.OSFile(str(partial), "wb") as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+    os.replace(partial, target)
+
+
+def open_arrow_dataset(path: Union[Path, Sequence[Path]]):
+    """Open cached Arrow file(s) as one memory-mapped pyarrow dataset, in the given order"""
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    source = str(path) if isinstance(path, (str, Path)) else [str(p) for p in path]
+    return ds.dataset(source, format="arrow", filesystem=fs.LocalFileSystem(use_mmap=True))
+
+
+def to_expression(filters: Optional[Filters]):
+    if filters is None:
+        return None
+    if isinstance(filters, (list, tuple)):
+        import pyarrow.parquet as pq
+
+        return pq.filters_to_expression(filters)
+    return filters
+
+
+def scan(dataset, columns: Optional[Sequence[str]] = None, filters: Optional[Filters] = None, output: str = "pandas"):
+    """Project and filter a dataset, reading only the columns and rows asked for"""
+    if output not in OUTPUTS:
+        raise DeHugError(f"Unknown output {output!r}, expected one of {', '.join(OUTPUTS)}")
+
+    expression = to_expression(filters)
+    if output == "dataset":
+        # Always a Scanner, with or without projection and filters; materialized
+        # lazily by the caller and still memory-mapped underneath
+        return dataset.scanner(columns=columns, filter=expression)
+
+    table = dataset.to_table(columns=columns, filter=expression)
+    if output == "arrow":
+        return table
+    return table.to_pandas()
+
+
+def load_dataset_from_cid(
+    cid: str,
+    format_hint: Optional[str] = None,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Filters] = None,
+    output: str = "pandas",
+    cache_dir: str = "/tmp/dehug",
+    gateway: str = "https://gateway.pinata.cloud/ipfs",
+):
+    """Load a dataset CID as a table
+
+    Parquet, CSV, JSONL and JSON-array content is converted once into an Arrow
+    file under ``cache_dir``; later loads memory-map it without touching the
+    network. ``text`` returns a str and ``binary`` returns bytes.
+
+    Args:
+        cid: Dataset IPFS CID
+        format_hint: parquet, csv, tsv, jsonl, json, text or binary; sniffed if omitted
+        columns: Only read these columns
+        filters: pyarrow expression or DNF tuples like [("label", "=", 1)]
+        output: "pandas" (DataFrame), "arrow" (pyarrow.Table) or "dataset" (lazy scanner)
+        cache_dir: Local cache directory
+        gateway: IPFS gateway URL
+
+    Returns:
+        Loaded dataset
+    """
+    data_dir = Path(cache_dir) / "datasets"
+    arrow_path = data_dir / f"{cid}.arrow"
+    raw_path = data_dir / f"{cid}.raw"
+    hint = normalize_format(format_hint)
+
+    if hint in ("text", "binary"):
+        _download_raw(cid, raw_path, gateway)
+        if hint == "text":
+            return raw_path.read_text(encoding="utf-8")
+        return raw_path.read_bytes()
+
+    if not arrow_path.exists():
+        _download_raw(cid, raw_path, gateway)
+        if detect_format(raw_path, format_hint) == "json":
+            with open(raw_path, "r", encoding="utf-8") as f:
+                content = json.load(f)
+            if not isinstance(content, list):
+                return content
+
+    arrow_path = cache_as_arrow(cid, format_hint, cache_dir, gateway)
+    return scan(open_arrow_dataset(arrow_path), columns, filters, output)
+
+
+def _download_raw(cid: str, raw_path: Path, gateway: str):
+    if raw_path.exists():
+        return
+    try:
+        load_content_from_cid(cid, str(raw_path), gateway)
+    except Exception as e:
+        raise DatasetNotFoundError(f"Dataset not found: {e}")
+
+
+def cache_as_arrow(
+    cid: str,
+    format_hint: Optional[str] = None,
+    cache_dir: str = "/tmp/dehug",
+    gateway: str = "https://gateway.pinata.cloud/ipfs",
+) -> Path:
+    """Download a tabular CID and convert it to a cached Arrow file, once
+
+    Returns the path of the Arrow file. CIDs are immutable, so an existing
+    file is always valid.
+    """
+    data_dir = Path(cache_dir) / "datasets"
+    arrow_path = data_dir / f"{cid}.arrow"
+    raw_path = data_dir / f"{cid}.raw"
+    if arrow_path.exists():
+        return arrow_path
+
+    _download_raw(cid, raw_path, gateway)
+    data_format = detect_format(raw_path, format_hint)
+    if data_format not in TABULAR_FORMATS:
+        raise DeHugError(f"Unsupported dataset format: {format_hint}")
+
+    logger.info(f"Converting dataset {cid} ({data_format}) to Arrow")
+    convert_to_arrow(raw_path, arrow_path, data_format, format_hint)
+    # The Arrow file holds everything; keep only one copy on disk
+    raw_path.unlink(missing_ok=True)
+    return arrow_path
+
+
+def rebatch(batches: Iterable, batch_size: int) -> Iterator:
+    """Regroup record batches into batches of exactly ``batch_size`` rows (last may be short)"""
+    import pyarrow as pa
+
+    def combine(pending: List) -> "pa.Table":
+        # JSONL batches may widen the schema partway through
+        tables = [pa.Table.from_batches([batch]) for batch in pending]
+        return pa.concat_tables(tables, promote_options="permissive")
+
+    pending, rows = [], 0
+    for batch in batches:
+        if not batch.num_rows:
+            continue
+        pending.append(batch)
+        rows += batch.num_rows
+        while rows >= batch_size:
+            table = combine(pending)
+            yield table.slice(0, batch_size).combine_chunks().to_batches()[0]
+            rest = table.slice(batch_size)
+            pending, rows = rest.to_batches(), rest.num_rows
+    if rows:
+        yield combine(pending).combine_chunks().to_batches()[0]
+
+
+def _select(batches: Iterable, columns: Optional[Sequence[str]], filters: Optional[Filters]) -> Iterator:
+    """Apply row filters and column projection batch by batch"""
+    import pyarrow as pa
+
+    expression = to_expression(filters)
+    for batch in batches:
+        if expression is not None or columns is not None:
+            table = pa.Table.from_batches([batch])
+            if expression is not None:
+                table = table.filter(expression)
+            if columns is not None:
+                table = table.select(list(columns))
+            yield from table.to_batches()
+        else:
+            yield batch
+
+
+def _conform(table, schema):
+    """Cast a table to ``schema``, adding fields it lacks as nulls"""
+    import pyarrow as pa
+
+    arrays = [
+        table.column(field.name).cast(field.type)
+        if field.name in table.column_names
+        else pa.nulls(table.num_rows, field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _iter_jsonl_lines(lines: Iterable[bytes], batch_size: int) -> Iterator:
+    """Parse JSONL into batches, widening the schema as new fields or types appear
+
+    Each batch's types are inferred from its own rows and unified with the
+    batches before it: a field that was null so far takes its first real
+    type, and a field first seen later is added. Earlier batches are not
+    revisited, so later ones may carry a wider schema.
+    """
+    import pyarrow as pa
+
+    schema, rows = None, []
+
+    def to_batches(rows: List[dict]) -> List:
+        nonlocal schema
+        # from_pylist takes its columns from the first row only
+        keys = dict.fromkeys(key for row in rows for key in row)
+        table = pa.Table.from_pydict({key: [row.get(key) for row in rows] for key in keys})
+        try:
+            if schema is not None:
+                schema = pa.unify_schemas([schema, table.schema], promote_options="permissive")
+                table = _conform(table, schema)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            raise DeHugError(f"JSONL fields change to incompatible types between rows: {e}")
+        schema = table.schema
+        return table.to_batches()
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        rows.append(json.loads(line))
+        if len(rows) >= batch_size:
+            yield from to_batches(rows)
+            rows = []
+    if rows:
+        yield from to_batches(rows)
+
+
+def _iter_raw_batches(source, data_format: str, read_columns, batch_size: int, format_hint=None) -> Iterator:
+    """Parse CSV from a path or binary stream, JSONL from lines, parquet from a path"""
+    if data_format == "csv":
+        from pyarrow import csv
+
+        reader = csv.open_csv(
+            source,
+            read_options=csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+            parse_options=_csv_options(format_hint),
+            convert_options=csv.ConvertOptions(include_columns=read_columns),
+        )
+        yield from reader
+    elif data_format == "jsonl":
+        yield from _iter_jsonl_lines(source, batch_size)
+    elif data_format == "parquet":
+        import pyarrow.parquet as pq
+
+        yield from pq.ParquetFile(source).iter_batches(batch_size=batch_size, columns=read_columns)
+    else:
+        raise DeHugError(f"Streaming supports parquet, csv and jsonl, not {data_format}")
+
+
+def _stream_from_network(cid: str, data_format: str, read_columns, batch_size: int, format_hint, gateway: str) -> Iterator:
+    response = open_ipfs_stream(cid, gateway)
+    try:
+        source = response.iter_lines() if data_format == "jsonl" else response.raw
+        yield from _iter_raw_batches(source, data_format, read_columns, batch_size, format_hint)
+    finally:
+        response.close()
+
+
+def stream_dataset_from_cid(
+    cid: str,
+    format_hint: Optional[str] = None,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Filters] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    cache_dir: str = "/tmp/dehug",
+    gateway: str = "https://gateway.pinata.cloud/ipfs",
+) -> Iterator:
+    """Iterate over a dataset CID as pyarrow RecordBatches of ``batch_size`` rows
+
+    Memory stays bounded by one batch regardless of dataset size. For JSONL
+    the schema can widen between batches as new fields or types appear. A cached
+    Arrow or raw file is read from disk; otherwise CSV and JSONL are parsed
+    straight from the download stream. Parquet needs random access to its
+    footer, so it is streamed to the disk cache first and read from there.
+    """
+    data_dir = Path(cache_dir) / "datasets"
+    arrow_path = data_dir / f"{cid}.arrow"
+    raw_path = data_dir / f"{cid}.raw"
+
+    if arrow_path.exists():
+        dataset = open_arrow_dataset(arrow_path)
+        batches = dataset.to_batches(
+            columns=columns, filter=to_expression(filters), batch_size=batch_size
+        )
+        yield from rebatch(batches, batch_size)
+        return
+
+    data_format = normalize_format(format_hint)
+    if data_format == "json":
+        raise DeHugError("Streaming needs line-delimited JSON (jsonl), not a JSON array")
+    # Without a hint the format is sniffed from the file, and parquet needs its footer
+    if data_format in (None, "parquet") and not raw_path.exists():
+        try:
+            download_to_file(cid, str(raw_path), gateway)
+        except Exception as e:
+            raise DatasetNotFoundError(f"Dataset not found: {e}")
+
+    # Filters may use columns outside the projection, so read those too
+    read_columns = list(columns) if columns is not None and filters is None else None
+
+    if raw_path.exists():
+        data_format = detect_format(raw_path, format_hint)
+        if data_format == "jsonl":
+            with open(raw_path, "rb") as f:
+                batches = _iter_raw_batches(f, data_format, read_columns, batch_size)
+                yield from rebatch(_select(batches, columns, filters), batch_size)
+            return
+        batches = _iter_raw_batches(str(raw_path), data_format, read_columns, batch_size, format_hint)
+    else:
+        batches = _stream_from_network(cid, data_format, read_columns, batch_size, format_hint, gateway)
+    yield from rebatch(_select(batches, columns, filters), batch_size)
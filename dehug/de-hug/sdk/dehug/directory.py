@@ -0,0 +1,210 @@
+"""Directory CIDs: list a UnixFS tree and download selected files in parallel"""
+
+import base64
+import fnmatch
+import json
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from .chunkstore import CHUNK_MANIFEST, ChunkStore
+from .exceptions import CIDNotDirectoryError, NetworkError
+from .utils import download_to_file
+
+logger = logging.getLogger("dehug.directory")
+
+# UnixFS node types (the Type field of the Data protobuf)
+UNIXFS_RAW, UNIXFS_DIRECTORY, UNIXFS_FILE, UNIXFS_HAMT_SHARD = 0, 1, 2, 5
+
+# Other weight formats that duplicate a .safetensors file in the same directory
+DUPLICATE_WEIGHT_PATTERNS = ("*.bin", "*.pt", "*.pth", "*.h5", "*.msgpack", "*.ckpt")
+
+
+def fetch_dag_node(cid: str, gateway: str, timeout: float = 30) -> Optional[Dict[str, Any]]:
+    """Fetch a dag-pb node as dag-json: {"Data": ..., "Links": [...]}
+
+    Returns None when the gateway answers with the content itself instead
+    (raw leaves, or gateways without dag-json support), i.e. not a directory.
+    """
+    import requests
+
+    url = f"{gateway.rstrip('/')}/{cid}"
+    try:
+        response = requests.get(
+            url,
+            params={"format": "dag-json"},
+            headers={"Accept": "application/vnd.ipld.dag-json"},
+            stream=True,
+            timeout=timeout,
+        )
+        with response:
+            if response.status_code in (400, 406, 415, 501):
+                return None
+            response.raise_for_status()
+            if "json" not in response.headers.get("Content-Type", ""):
+                return None
+            return response.json()
+    except requests.exceptions.RequestException as e:
+        raise NetworkError(f"Failed to list IPFS node {cid}: {e}")
+    except ValueError:
+        return None
+
+
+def unixfs_type(node: Dict[str, Any]) -> int:
+    """Read the Type field from a node's UnixFS Data protobuf"""
+    encoded = node.get("Data", {}).get("/", {}).get("bytes", "")
+    data = base64.b64decode(encoded + "=" * (-len(encoded) % 4))
+    # Field 1 (Type) is a varint with tag byte 0x08; every value fits in one byte
+    if len(data) >= 2 and data[0] == 0x08:
+        return data[1]
+    return UNIXFS_RAW
+
+
+def is_raw_cid(cid: str) -> bool:
+    """CIDv1 with the raw codec (base32 "bafk...") is always a file leaf"""
+    return cid.startswith("bafk")
+
+
+def list_directory(
+    cid: str,
+    gateway: str = "https://gateway.pinata.cloud/ipfs",
+    max_workers: int = 8,
+    timeout: float = 30,
+) -> List[Dict[str, Any]]:
+    """Recursively list the files under a directory CID
+
+    Returns dicts with the relative ``path``, file ``cid`` and ``size`` (the
+    link's cumulative size, which includes a little DAG overhead). Child nodes
+    of each level are fetched concurrently.
+    """
+    root = None if is_raw_cid(cid) else fetch_dag_node(cid, gateway, timeout)
+    if root is None or unixfs_type(root) not in (UNIXFS_DIRECTORY, UNIXFS_HAMT_SHARD):
+        raise CIDNotDirectoryError(f"CID {cid} is not a directory")
+
+    files: List[Dict[str, Any]] = []
+    # (node, path prefix) pairs still to expand
+    level = [(root, "")]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while level:
+            children = []
+            for node, prefix in level:
+                sharded = unixfs_type(node) == UNIXFS_HAMT_SHARD
+                for link in node.get("Links", []):
+                    name = link.get("Name", "")
+                    child = {
+                        "cid": link["Hash"]["/"],
+                        "size": link.get("Tsize", 0),
+                        "shard_bucket": sharded and len(name) == 2,
+                    }
+                    # HAMT shard links carry a two-character bucket prefix
+                    name = name[2:] if sharded else name
+                    if name in (".", "..") or "/" in name:
+                        logger.warning(f"Skipping unsafe link name {name!r} in {cid}")
+                        continue
+                    child["path"] = posixpath.join(prefix, name) if name else prefix
+                    children.append(child)
+
+            pending = [c for c in children if not is_raw_cid(c["cid"])]
+            nodes = pool.map(lambda c: fetch_dag_node(c["cid"], gateway, timeout), pending)
+            fetched = dict(zip((c["cid"] for c in pending), nodes))
+
+            level = []
+            for child in children:
+                node = fetched.get(child["cid"])
+                kind = unixfs_type(node) if node is not None else UNIXFS_RAW
+                if child["shard_bucket"] or kind in (UNIXFS_DIRECTORY, UNIXFS_HAMT_SHARD):
+                    level.append((node, child["path"]))
+                else:
+                    files.append({"path": child["path"], "cid": child["cid"], "size": child["size"]})
+
+    return sorted(files, key=lambda f: f["path"])
+
+
+def _matches(path: str, patterns: Sequence[str]) -> bool:
+    name = posixpath.basename(path)
+    return any(fnmatch.fnmatch(path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def select_files(
+    files: List[Dict[str, Any]],
+    allow_patterns: Optional[Sequence[str]] = None,
+    ignore_patterns: Optional[Sequence[str]] = None,
+    prefer_safetensors: bool = True,
+) -> List[Dict[str, Any]]:
+    """Filter a listing by glob patterns (matched against the path or file name)
+
+    With ``prefer_safetensors``, other weight formats are skipped in any
+    directory that also has ``.safetensors`` weights.
+    """
+    selected = [
+        f
+        for f in files
+        if (allow_patterns is None or _matches(f["path"], allow_patterns))
+        and not (ignore_patterns and _matches(f["path"], ignore_patterns))
+    ]
+
+    if prefer_safetensors:
+        safetensors_dirs = {
+            posixpath.dirname(f["path"]) for f in selected if f["path"].endswith(".safetensors")
+        }
+        selected = [
+            f
+            for f in selected
+            if not (
+                posixpath.dirname(f["path"]) in safetensors_dirs
+                and _matches(f["path"], DUPLICATE_WEIGHT_PATTERNS)
+            )
+        ]
+    return selected
+
+
+def download_directory(
+    cid: str,
+    target_dir: str,
+    gateway: str = "https://gateway.pinata.cloud/ipfs",
+    allow_patterns: Optional[Sequence[str]] = None,
+    ignore_patterns: Optional[Sequence[str]] = None,
+    prefer_safetensors: bool = True,
+    max_workers: int = 8,
+    chunk_store: Optional[ChunkStore] = None,
+) -> Path:
+    """Download the selected files of a directory CID into ``target_dir``
+
+    The directory layout is preserved, so the result can be passed straight
+    to ``from_pretrained``. Files already present are not downloaded again.
+    With a ``chunk_store``, files go through it, and if the directory
+    publishes a chunk manifest only chunks missing from the store are fetched.
+    """
+    target = Path(target_dir)
+    listing = list_directory(cid, gateway, max_workers)
+    files = select_files(listing, allow_patterns, ignore_patterns, prefer_safetensors)
+
+    recipes: Dict[str, Any] = {}
+    manifest = next((f for f in listing if f["path"] == CHUNK_MANIFEST), None)
+    if chunk_store is not None and manifest is not None:
+        manifest_path = chunk_store.fetch(
+            manifest["cid"], str(chunk_store.root / "manifests" / f"{cid}.json"), gateway
+        )
+        recipes = json.loads(Path(manifest_path).read_text())
+    files = [f for f in files if f["path"] != CHUNK_MANIFEST]
+
+    missing = [f for f in files if not (target / f["path"]).exists()]
+    logger.info(
+        f"Downloading {len(missing)} of {len(files)} selected files from directory {cid}"
+    )
+
+    def fetch(entry):
+        path = str(target / entry["path"])
+        if chunk_store is not None:
+            chunk_store.fetch(entry["cid"], path, gateway, recipes.get(entry["path"]))
+        else:
+            download_to_file(entry["cid"], path, gateway)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # list() re-raises the first download error
+        list(pool.map(fetch, missing))
+
+    target.mkdir(parents=True, exist_ok=True)
+    return target
@@ -19,6 +19,12 @@ class IPFSError(DeHugError):
     pass
 
 
+class CIDNotDirectoryError(IPFSError):
+    """CID is a file where a directory was expected"""
+
+    pass
+
+
 class ModelNotFoundError(DeHugError):
     """Model not found error"""
 
@@ -0,0 +1,281 @@
+"""Node-local caching IPFS gateway shared by SDK clients
+
+Serves ``/ipfs/<cid>[/<path>]`` like a public gateway, so clients only need
+``ipfs_gateway`` pointed at it (e.g. ``http://localhost:8080/ipfs``). Content is
+fetched from the upstream gateway once and cached on disk; concurrent misses
+for the same CID wait for a single upstream download. Hits are sent with
+``sendfile`` and support single byte ranges.
+
+Usage:
+    dehug-gateway --port 8080 --cache-dir /var/cache/dehug --max-cache-gb 200
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from .exceptions import NetworkError
+from .utils import download_to_file
+
+logger = logging.getLogger("dehug.gateway")
+
+DEFAULT_UPSTREAM = "https://gateway.pinata.cloud/ipfs"
+DAG_JSON = "application/vnd.ipld.dag-json"
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class GatewayCache:
+    """On-disk cache of upstream gateway responses with per-key miss coalescing"""
+
+    def __init__(self, cache_dir: str, upstream: str = DEFAULT_UPSTREAM, max_bytes: Optional[int] = None):
+        self.root = Path(cache_dir)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.upstream = upstream
+        self.max_bytes = max_bytes
+
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0, "bytes_sent": 0}
+        # Bytes on disk, kept up to date on each miss so only eviction scans the cache
+        self._total_bytes = sum(size for _, size, _ in self._files()) if max_bytes else 0
+
+    def path_for(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return self.root / digest[:2] / digest
+
+    def count(self, stat: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[stat] += amount
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def _open(path: Path) -> Optional[BinaryIO]:
+        """Open a cached file, or return None if it isn't (or is no longer) there
+
+        An open file stays readable after eviction unlinks it.
+        """
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        os.utime(f.fileno())  # Access time for LRU eviction
+        return f
+
+    def open(self, content_path: str, dag_json: bool = False) -> BinaryIO:
+        """Open the cached file for ``<cid>[/<path>]``, downloading it on a miss"""
+        key = f"{content_path}?dag-json" if dag_json else content_path
+        path = self.path_for(key)
+        f = self._open(path)
+        if f is not None:
+            self.count("hits")
+            return f
+
+        lock = self._lock_for(key)
+        if lock.locked():
+            self.count("coalesced")
+        with lock:
+            # Another request may have filled it while we waited
+            f = self._open(path)
+            if f is not None:
+                return f
+            self.count("misses")
+            download_to_file(
+                content_path,
+                str(path),
+                self.upstream,
+                params={"format": "dag-json"} if dag_json else None,
+                headers={"Accept": DAG_JSON} if dag_json else None,
+            )
+            f = open(path, "rb")
+        with self._locks_guard:
+            self._locks.pop(key, None)
+        self.evict(os.fstat(f.fileno()).st_size)
+        return f
+
+    def _files(self) -> List[Tuple[float, int, Path]]:
+        files = []
+        for path in self.root.glob("*/*"):
+            if path.name.endswith(".partial"):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def evict(self, added: int = 0):
+        """Count ``added`` new bytes and remove least recently used files while over ``max_bytes``"""
+        if not self.max_bytes:
+            return
+        with self._evict_lock:
+            self._total_bytes += added
+            if self._total_bytes <= self.max_bytes:
+                return
+            # Rescan only when over budget; this also corrects any drift
+            files = self._files()
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files, key=lambda f: f[0]):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+            self._total_bytes = total
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive (start, end); raise ValueError if unsatisfiable"""
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        # Multiple or malformed ranges: serve the whole file
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        return None
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    cache: GatewayCache = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_HEAD(self):
+        self.handle_request(send_body=False)
+
+    def do_GET(self):
+        self.handle_request(send_body=True)
+
+    def handle_request(self, send_body: bool):
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            return self.send_json(200, self.cache.snapshot())
+        if not url.path.startswith("/ipfs/") or len(url.path) <= len("/ipfs/"):
+            return self.send_json(404, {"error": "Expected /ipfs/<cid>"})
+
+        content_path = unquote(url.path[len("/ipfs/"):]).strip("/")
+        if ".." in content_path.split("/"):
+            return self.send_json(400, {"error": "Invalid path"})
+        dag_json = (
+            parse_qs(url.query).get("format") == ["dag-json"]
+            or DAG_JSON in self.headers.get("Accept", "")
+        )
+
+        try:
+            f = self.cache.open(content_path, dag_json)
+        except NetworkError as e:
+            self.cache.count("errors")
+            response = getattr(e.__cause__, "response", None)
+            status = response.status_code if response is not None else 502
+            return self.send_json(status if 400 <= status < 600 else 502, {"error": str(e)})
+
+        content_type = DAG_JSON if dag_json else (
+            mimetypes.guess_type(content_path)[0] or "application/octet-stream"
+        )
+        self.send_file(f, content_type, send_body)
+
+    def send_file(self, f: BinaryIO, content_type: str, send_body: bool):
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            try:
+                byte_range = parse_range(self.headers.get("Range"), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            start, end = byte_range or (0, size - 1)
+            length = end - start + 1 if size else 0
+            self.send_response(206 if byte_range else 200)
+            if byte_range:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            # CIDs are immutable
+            self.send_header("Cache-Control", "public, max-age=29030400, immutable")
+            self.end_headers()
+
+            if send_body and length:
+                # Zero-copy from the page cache straight to the socket
+                self.connection.sendfile(f, start, length)
+                self.cache.count("bytes_sent", length)
+
+    def send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+
+def create_server(
+    host: str = "0.0.0.0",
+    port: int = 8080,
+    cache_dir: str = "/tmp/dehug/gateway",
+    upstream: str = DEFAULT_UPSTREAM,
+    max_bytes: Optional[int] = None,
+) -> ThreadingHTTPServer:
+    handler = type("Handler", (GatewayHandler,), {"cache": GatewayCache(cache_dir, upstream, max_bytes)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Caching IPFS gateway for DeHug clients")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--cache-dir", default="/tmp/dehug/gateway")
+    parser.add_argument("--upstream", default=DEFAULT_UPSTREAM, help="Gateway to fetch misses from")
+    parser.add_argument("--max-cache-gb", type=float, help="Evict least recently used content above this size")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    max_bytes = int(args.max_cache_gb * (1 << 30)) if args.max_cache_gb else None
+    server = create_server(args.host, args.port, args.cache_dir, args.upstream, max_bytes)
+    logger.info(f"Serving /ipfs/ on {args.host}:{args.port}, upstream {args.upstream}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Persistent SQLite index of fetched CIDs"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cids (
+    cid TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    metadata TEXT,
+    size INTEGER,
+    content_type TEXT,
+    local_path TEXT,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    verified INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_cids_last_access ON cids (last_access);
+CREATE INDEX IF NOT EXISTS ix_cids_kind ON cids (kind);
+"""
+
+# Leading bytes of formats we expect to see in the cache
+MAGIC_TYPES = [
+    (b"PK\x03\x04", "application/zip"),
+    (b"PAR1", "application/vnd.apache.parquet"),
+    (b"ARROW1", "application/vnd.apache.arrow.file"),
+]
+
+
+def sniff_content_type(path: Path) -> Optional[str]:
+    if not path.is_file():
+        return "inode/directory" if path.is_dir() else None
+    with open(path, "rb") as f:
+        head = f.read(64)
+    for magic, content_type in MAGIC_TYPES:
+        if head.startswith(magic):
+            return content_type
+    if head.lstrip()[:1] in (b"{", b"["):
+        return "application/json"
+    return "application/octet-stream"
+
+
+def path_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size
+
+
+class CidIndex:
+    """CID -> metadata, size, content type, local path, last access and verification
+
+    Consulted before the network: CIDs are immutable, so anything indexed
+    with an intact local copy never needs to be fetched again. ``verified``
+    means the local copy still has the size recorded when it was fetched.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def _row(self, row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["metadata"] = json.loads(entry["metadata"]) if entry["metadata"] else None
+        entry["verified"] = bool(entry["verified"])
+        return entry
+
+    def get(self, cid: str, touch: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM cids WHERE cid = ?", (cid,)).fetchone()
+            if row is not None and touch:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE cids SET last_access = ? WHERE cid = ?", (time.time(), cid)
+                    )
+        return self._row(row)
+
+    def local_path(self, cid: str, kind: Optional[str] = None) -> Optional[Path]:
+        """Indexed local copy of a CID, if it is still on disk (and was recorded as ``kind``)"""
+        entry = self.get(cid)
+        if entry is None or not entry["local_path"] or (kind and entry["kind"] != kind):
+            return None
+        path = Path(entry["local_path"])
+        return path if path.exists() else None
+
+    def metadata(self, cid: str) -> Optional[Any]:
+        entry = self.get(cid)
+        return entry["metadata"] if entry else None
+
+    def record(
+        self,
+        cid: str,
+        kind: str,
+        local_path: Optional[str] = None,
+        metadata: Any = None,
+        content_type: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Add or refresh a CID after fetching it"""
+        path = Path(local_path) if local_path else None
+        size = path_size(path) if path is not None and path.exists() else None
+        if content_type is None and path is not None:
+            content_type = sniff_content_type(path)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO cids (cid, kind, metadata, size, content_type, local_path,
+                                  fetched_at, last_access, verified)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (cid) DO UPDATE SET
+                    kind = excluded.kind,
+                    metadata = COALESCE(excluded.metadata, cids.metadata),
+                    size = COALESCE(excluded.size, cids.size),
+                    content_type = COALESCE(excluded.content_type, cids.content_type),
+                    local_path = COALESCE(excluded.local_path, cids.local_path),
+                    fetched_at = excluded.fetched_at,
+                    last_access = excluded.last_access,
+                    verified = excluded.verified
+                """,
+                (
+                    cid,
+                    kind,
+                    json.dumps(metadata) if metadata is not None else None,
+                    size,
+                    content_type,
+                    str(path.resolve()) if path is not None else None,
+                    now,
+                    now,
+                    int(size is not None),
+                ),
+            )
+        return self.get(cid, touch=False)
+
+    def verify(self, cid: str) -> bool:
+        """Re-check that the local copy exists with its recorded size"""
+        entry = self.get(cid, touch=False)
+        if entry is None:
+            return False
+        path = Path(entry["local_path"]) if entry["local_path"] else None
+        ok = path is not None and path.exists() and path_size(path) == entry["size"]
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE cids SET verified = ? WHERE cid = ?", (int(ok), cid))
+        return ok
+
+    def remove(self, cid: str, delete_files: bool = False):
+        entry = self.get(cid, touch=False)
+        if entry is None:
+            return
+        if delete_files and entry["local_path"]:
+            path = Path(entry["local_path"])
+            if path.is_dir():
+                import shutil
+
+                shutil.rmtree(path, ignore_errors=True)
+            elif path.exists():
+                os.remove(path)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cids WHERE cid = ?", (cid,))
+
+    def entries(
+        self, kind: Optional[str] = None, limit: Optional[int] = None, least_recent_first: bool = False
+    ) -> List[Dict[str, Any]]:
+        """List indexed CIDs, most recently used first by default"""
+        query = "SELECT * FROM cids"
+        params: list = []
+        if kind:
+            query += " WHERE kind = ?"
+            params.append(kind)
+        query += f" ORDER BY last_access {'ASC' if least_recent_first else 'DESC'}"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._row(row) for row in rows]
+
+    def total_size(self, kind: Optional[str] = None) -> int:
+        query = "SELECT COALESCE(SUM(size), 0) FROM cids"
+        params = (kind,) if kind else ()
+        if kind:
+            query += " WHERE kind = ?"
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def not_accessed_since(self, seconds: float) -> List[Dict[str, Any]]:
+        """Entries idle for longer than ``seconds``: candidates for cleanup"""
+        cutoff = time.time() - seconds
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM cids WHERE last_access < ? ORDER BY last_access", (cutoff,)
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,13 +1,19 @@
 """DeHug Repository class for managing models and datasets"""
 
-import requests
 from typing import Dict, List, Any, Optional, Union
 import json
 
 from .exceptions import (
+    CIDNotDirectoryError,
     ModelNotFoundError,
 )
-from .utils import load_content_from_cid, download_from_ipfs
+from .chunkstore import ChunkStore
+from .datasets import DEFAULT_BATCH_SIZE, load_dataset_from_cid, stream_dataset_from_cid
+from .directory import download_directory
+from .index import CidIndex
+from .shards import load_sharded_dataset, stream_sharded_dataset
+from .tracking import DownloadReporter
+from .utils import load_content_from_cid, download_to_file
 from pathlib import Path
 
 class DeHugRepository:
@@ -24,79 +30,270 @@ class DeHugRepository:
             "ipfs_gateway", "https://gateway.pinata.cloud/ipfs"
         )
         self.timeout = config.get("request_timeout", 60)
-        self.track_api = "https://download-tracker.vercel.app"
+        self.track_api = config.get("track_api", "https://download-tracker.vercel.app")
+        self.reporter = None
+        if config.get("track_downloads", True):
+            self.reporter = DownloadReporter(self.track_api)
+        download_dir = config.get("download_dir", "/tmp/dehug")
+        # Remembers what has been fetched, so repeat lookups never hit the network
+        self.index = None
+        if config.get("use_index", True):
+            self.index = CidIndex(config.get("index_path", f"{download_dir}/index.sqlite"))
+        # Deduplicate related model versions at chunk level in the local cache
+        self.chunk_store = None
+        if config.get("chunk_store", False):
+            self.chunk_store = ChunkStore(config.get("chunk_store_dir", f"{download_dir}/store"))
 
-    @staticmethod
-    def _track_download(item_name: str):
-        try:
-            response = requests.post(
-                f"{TRACK_API}/track/download",
-                json={"item_name": item_name, "source": "sdk"},
-                timeout=5,
+    def _track_download(self, item_name: str):
+        """Queue a download event; sent in the background so it adds no latency"""
+        if self.reporter is not None:
+            self.reporter.report(item_name, source="sdk")
+
+    def load_dataset(
+        self,
+        cid: str,
+        format_hint: str = None,
+        columns: Optional[List[str]] = None,
+        filters: Any = None,
+        output: str = "pandas",
+        streaming: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> Any:
+        """Load dataset by CID
+
+        Tabular datasets are cached as memory-mapped Arrow files; only the
+        requested columns and matching rows are materialized. With
+        ``streaming=True`` an iterator of pyarrow RecordBatches is returned
+        instead, parsed incrementally so memory stays bounded by one batch.
+
+        Args:
+            cid: Dataset IPFS CID
+            format_hint: Format hint for parsing (parquet, csv, jsonl, json, text, binary)
+            columns: Only read these columns
+            filters: pyarrow expression or DNF tuples like [("label", "=", 1)]
+            output: "pandas", "arrow" (pyarrow.Table) or "dataset" (lazy scanner)
+            streaming: Return an iterator of RecordBatches (parquet, csv, jsonl)
+            batch_size: Rows per batch when streaming
+
+        Returns:
+            Loaded dataset
+        """
+        if streaming:
+            self._track_download(cid)
+            return stream_dataset_from_cid(
+                cid,
+                format_hint,
+                columns=columns,
+                filters=filters,
+                batch_size=batch_size,
+                cache_dir=self.config.get("download_dir", "/tmp/dehug"),
+                gateway=self.ipfs_gateway,
             )
-            response.raise_for_status()
-        except requests.RequestException as e:
-            print(f"[DeHug SDK] Tracking failed: {e}")
 
-    def load_dataset(self, cid: str, format_hint: str = None) -> Any:
-        """Load dataset by name or CID
+        content = load_dataset_from_cid(
+            cid,
+            format_hint,
+            columns=columns,
+            filters=filters,
+            output=output,
+            cache_dir=self.config.get("download_dir", "/tmp/dehug"),
+            gateway=self.ipfs_gateway,
+        )
+        if self.index is not None:
+            arrow_path = Path(self.config.get("download_dir", "/tmp/dehug")) / "datasets" / f"{cid}.arrow"
+            if arrow_path.exists():
+                self.index.record(cid, "dataset", str(arrow_path))
+        self._track_download(cid)
+        return content
+
+    def load_sharded_dataset(
+        self,
+        manifest_cid: str,
+        columns: Optional[List[str]] = None,
+        filters: Any = None,
+        output: str = "pandas",
+        streaming: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        shuffle: bool = False,
+        seed: Optional[int] = None,
+        max_workers: Optional[int] = None,
+    ) -> Any:
+        """Load a dataset split across shard CIDs listed in a manifest CID
+
+        Shards are downloaded and decoded in parallel processes and cached
+        individually, so a later load only fetches shards it doesn't have.
 
         Args:
-            name_or_cid: Dataset name or IPFS CID
-            format_hint: Format hint for parsing (json, csv, text, binary)
+            manifest_cid: CID of the JSON manifest listing shard CIDs
+            columns: Only read these columns
+            filters: pyarrow expression or DNF tuples like [("label", "=", 1)]
+            output: "pandas", "arrow" (pyarrow.Table) or "dataset" (lazy scanner)
+            streaming: Return an iterator of RecordBatches
+            batch_size: Rows per batch when streaming
+            shuffle: Randomize shard order (and interleave batches when streaming)
+            seed: Seed that makes the shuffled order reproducible
+            max_workers: Processes used to fetch and decode shards
 
         Returns:
             Loaded dataset
         """
-        return load_content_from_cid(cid, format_hint)
+        options = dict(
+            columns=columns,
+            filters=filters,
+            shuffle=shuffle,
+            seed=seed,
+            max_workers=max_workers,
+            cache_dir=self.config.get("download_dir", "/tmp/dehug"),
+            gateway=self.ipfs_gateway,
+        )
+        self._track_download(manifest_cid)
+        if streaming:
+            return stream_sharded_dataset(manifest_cid, batch_size=batch_size, **options)
+        return load_sharded_dataset(manifest_cid, output=output, **options)
 
-    def load_model(self, name_or_cid: str) -> Dict[str, Any]:
-        """Load model metadata by name or CID
+    def load_model(self, name_or_cid: str) -> Path:
+        """Download a model archive by CID, or return the indexed local copy
 
         Args:
             name_or_cid: Model name or IPFS CID
 
         Returns:
-            Model metadata dictionary
+            Path to the downloaded model archive
         """
+        cached = self.index.local_path(name_or_cid, "model") if self.index is not None else None
+        if cached is not None:
+            self._track_download(name_or_cid)
+            return cached
+
         try:
             download_dir = self.config.get("download_dir", "/tmp/dehug")
             download_path = f"{download_dir}/{name_or_cid}.zip"
-            metadata = load_content_from_cid(name_or_cid, download_path, self.ipfs_gateway)
+            if self.chunk_store is not None:
+                model_path = self.chunk_store.fetch(name_or_cid, download_path, self.ipfs_gateway)
+            else:
+                model_path = load_content_from_cid(name_or_cid, download_path, self.ipfs_gateway)
+        except Exception as e:
+            raise ModelNotFoundError(f"Model not found: {e}")
+
+        if self.index is not None:
+            self.index.record(name_or_cid, "model", str(model_path))
+        self._track_download(name_or_cid)
+        return model_path
+
+    def get_metadata(self, cid: str) -> Dict[str, Any]:
+        """Fetch a JSON metadata CID (e.g. with ``name`` and ``files_cid``), index first
+
+        Args:
+            cid: Metadata IPFS CID
+
+        Returns:
+            Parsed metadata
+        """
+        metadata = self.index.metadata(cid) if self.index is not None else None
+        if metadata is not None:
             return metadata
+
+        download_dir = self.config.get("download_dir", "/tmp/dehug")
+        path = Path(download_dir) / "metadata" / f"{cid}.json"
+        try:
+            if not path.exists():
+                load_content_from_cid(cid, str(path), self.ipfs_gateway)
+            metadata = json.loads(path.read_text(encoding="utf-8"))
         except Exception as e:
             raise ModelNotFoundError(f"Model metadata not found: {e}")
 
+        if self.index is not None:
+            self.index.record(cid, "metadata", str(path), metadata, "application/json")
+        return metadata
+
     def download_model_files(
-        self, name_or_cid: str, download_dir: str = "./models"
+        self,
+        name_or_cid: str,
+        download_dir: str = "./models",
+        allow_patterns: Optional[List[str]] = None,
+        ignore_patterns: Optional[List[str]] = None,
+        max_workers: int = 8,
     ) -> str:
         """Download model files to local directory
 
+        A directory ``files_cid`` is listed and only the files matching
+        ``allow_patterns`` are fetched, concurrently, keeping the directory
+        layout so the result loads with ``from_pretrained``. Other weight
+        formats are skipped where ``.safetensors`` weights exist.
+
         Args:
             name_or_cid: Model name or IPFS CID
             download_dir: Directory to download files to
+            allow_patterns: Glob patterns of files to fetch (default: all)
+            ignore_patterns: Glob patterns of files to skip
+            max_workers: Concurrent file downloads
 
         Returns:
             Path to downloaded model directory
         """
-        model_metadata = self.load_model(name_or_cid)
+        model_metadata = self.get_metadata(name_or_cid)
+        self._track_download(name_or_cid)
 
         # Get model files CID
         files_cid = model_metadata.get("files_cid")
         if not files_cid:
             raise ModelNotFoundError("Model files CID not found in metadata")
 
-        # Create download directory
-       
-
         download_path = Path(download_dir) / (model_metadata.get("name", files_cid))
         download_path.mkdir(parents=True, exist_ok=True)
 
-        # Download model files (this would need to handle directories)
-        model_files = download_from_ipfs(files_cid)
-
-        # Save as binary file (in real implementation, would extract archive)
-        model_file_path = download_path / "model.bin"
-        model_file_path.write_bytes(model_files)
+        try:
+            download_directory(
+                files_cid,
+                str(download_path),
+                self.ipfs_gateway,
+                allow_patterns=allow_patterns,
+                ignore_patterns=ignore_patterns,
+                max_workers=max_workers,
+                chunk_store=self.chunk_store,
+            )
+        except CIDNotDirectoryError:
+            # Single-file upload
+            if self.chunk_store is not None:
+                self.chunk_store.fetch(files_cid, str(download_path / "model.bin"), self.ipfs_gateway)
+            else:
+                download_to_file(files_cid, str(download_path / "model.bin"), self.ipfs_gateway)
 
         return str(download_path)
+
+    def download_directory(
+        self,
+        cid: str,
+        target_dir: str,
+        allow_patterns: Optional[List[str]] = None,
+        ignore_patterns: Optional[List[str]] = None,
+        max_workers: int = 8,
+    ) -> Path:
+        """Download selected files of a directory CID, e.g. a model repo
+
+        Raises CIDNotDirectoryError if the CID is a single file.
+        """
+        selection = {"allow_patterns": allow_patterns, "ignore_patterns": ignore_patterns}
+        entry = self.index.get(cid) if self.index is not None else None
+        if (
+            entry is not None
+            and entry["metadata"] == selection
+            and entry["local_path"] == str(Path(target_dir).resolve())
+            and Path(target_dir).is_dir()
+        ):
+            self._track_download(cid)
+            return Path(target_dir)
+
+        path = download_directory(
+            cid,
+            target_dir,
+            self.ipfs_gateway,
+            allow_patterns=allow_patterns,
+            ignore_patterns=ignore_patterns,
+            max_workers=max_workers,
+            chunk_store=self.chunk_store,
+        )
+        if self.index is not None:
+            self.index.record(cid, "directory", str(path), selection, "inode/directory")
+        self._track_download(cid)
+        return path
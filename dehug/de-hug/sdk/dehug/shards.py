@@ -0,0 +1,165 @@
+"""Sharded datasets: a manifest CID listing shard CIDs, fetched in parallel"""
+
+import json
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from .datasets import (
+    DEFAULT_BATCH_SIZE,
+    Filters,
+    cache_as_arrow,
+    open_arrow_dataset,
+    rebatch,
+    scan,
+    to_expression,
+)
+from .exceptions import DatasetNotFoundError, DeHugError
+from .utils import load_content_from_cid
+
+logger = logging.getLogger("dehug.shards")
+
+
+def read_manifest(
+    manifest_cid: str, cache_dir: str = "/tmp/dehug", gateway: str = "https://gateway.pinata.cloud/ipfs"
+) -> List[Dict[str, Any]]:
+    """Fetch a dataset manifest and return its shards as {"cid", "format"} dicts
+
+    The manifest is JSON: either a list of shard CIDs, or an object like
+    ``{"format": "parquet", "shards": ["Qm...", {"cid": "Qm...", "format": "csv"}]}``.
+    """
+    path = Path(cache_dir) / "datasets" / f"{manifest_cid}.manifest.json"
+    if not path.exists():
+        try:
+            load_content_from_cid(manifest_cid, str(path), gateway)
+        except Exception as e:
+            raise DatasetNotFoundError(f"Dataset manifest not found: {e}")
+
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError as e:
+        raise DeHugError(f"Invalid dataset manifest {manifest_cid}: {e}")
+
+    if isinstance(manifest, list):
+        manifest = {"shards": manifest}
+    default_format = manifest.get("format")
+
+    shards = []
+    for shard in manifest.get("shards", []):
+        if isinstance(shard, str):
+            shard = {"cid": shard}
+        if not shard.get("cid"):
+            raise DeHugError(f"Shard without a cid in manifest {manifest_cid}")
+        shards.append({"cid": shard["cid"], "format": shard.get("format", default_format)})
+    if not shards:
+        raise DeHugError(f"Dataset manifest {manifest_cid} lists no shards")
+    return shards
+
+
+def _prepare_shard(job) -> str:
+    """Download and decode one shard into the Arrow cache (runs in a worker process)"""
+    cid, format_hint, cache_dir, gateway = job
+    return str(cache_as_arrow(cid, format_hint, cache_dir, gateway))
+
+
+def prepare_shards(
+    shards: List[Dict[str, Any]],
+    cache_dir: str = "/tmp/dehug",
+    gateway: str = "https://gateway.pinata.cloud/ipfs",
+    max_workers: Optional[int] = None,
+) -> Iterator[Path]:
+    """Yield each shard's cached Arrow file in manifest order
+
+    Shards already in the cache are not fetched again. The rest are downloaded
+    and parsed across a process pool, so decoding uses every core; results
+    are yielded in order as soon as each one (and those before it) is ready.
+    """
+    data_dir = Path(cache_dir) / "datasets"
+    missing = [s for s in shards if not (data_dir / f"{s['cid']}.arrow").exists()]
+    if not missing:
+        for shard in shards:
+            yield data_dir / f"{shard['cid']}.arrow"
+        return
+
+    workers = min(max_workers or os.cpu_count() or 1, len(missing))
+    logger.info(f"Fetching {len(missing)} of {len(shards)} shards with {workers} processes")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [(s["cid"], s["format"], cache_dir, gateway) for s in shards]
+        for path in pool.map(_prepare_shard, jobs):
+            yield Path(path)
+
+
+def shard_order(count: int, shuffle: bool, seed: Optional[int]) -> List[int]:
+    order = list(range(count))
+    if shuffle:
+        random.Random(seed).shuffle(order)
+    return order
+
+
+def load_sharded_dataset(
+    manifest_cid: str,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Filters] = None,
+    output: str = "pandas",
+    shuffle: bool = False,
+    seed: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    cache_dir: str = "/tmp/dehug",
+    gateway: str = "https://gateway.pinata.cloud/ipfs",
+):
+    """Load every shard of a manifest as one memory-mapped dataset
+
+    Rows come in manifest order, or in a seeded random shard order with
+    ``shuffle=True``.
+    """
+    shards = read_manifest(manifest_cid, cache_dir, gateway)
+    paths = list(prepare_shards(shards, cache_dir, gateway, max_workers))
+    paths = [paths[i] for i in shard_order(len(paths), shuffle, seed)]
+    return scan(open_arrow_dataset(paths), columns, filters, output)
+
+
+def stream_sharded_dataset(
+    manifest_cid: str,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Filters] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    shuffle: bool = False,
+    seed: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    cache_dir: str = "/tmp/dehug",
+    gateway: str = "https://gateway.pinata.cloud/ipfs",
+) -> Iterator:
+    """Iterate over the shards of a manifest as RecordBatches
+
+    In order, batches from the first shard are yielded while later shards are
+    still being fetched. With ``shuffle=True`` batches from all shards are
+    interleaved in a random order fixed by ``seed``, so each batch mixes
+    less correlated data without holding more than one batch per shard.
+    """
+    expression = to_expression(filters)
+    shards = read_manifest(manifest_cid, cache_dir, gateway)
+
+    def shard_batches(path: Path):
+        dataset = open_arrow_dataset(path)
+        return rebatch(
+            dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size),
+            batch_size,
+        )
+
+    if not shuffle:
+        for path in prepare_shards(shards, cache_dir, gateway, max_workers):
+            yield from shard_batches(path)
+        return
+
+    rng = random.Random(seed)
+    paths = list(prepare_shards(shards, cache_dir, gateway, max_workers))
+    iterators = [shard_batches(paths[i]) for i in shard_order(len(paths), True, seed)]
+    while iterators:
+        index = rng.randrange(len(iterators))
+        try:
+            yield next(iterators[index])
+        except StopIteration:
+            iterators.pop(index)
@@ -0,0 +1,111 @@
+"""Background download tracking for DeHug SDK"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("dehug.tracking")
+
+
+class DownloadReporter:
+    """Queue download events and send them to the tracker in batches
+
+    ``report`` never blocks the caller: events go onto a bounded queue and a
+    daemon thread posts them to ``/track/downloads`` when ``batch_size`` events
+    are waiting or ``flush_interval`` seconds have passed. If the queue is full
+    events are dropped, since tracking must never slow down downloads.
+    """
+
+    def __init__(
+        self,
+        track_api: str,
+        batch_size: int = 50,
+        flush_interval: float = 2.0,
+        max_queue: int = 1000,
+        timeout: float = 5,
+    ):
+        self.track_api = track_api.rstrip("/")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+
+        self._queue: "queue.Queue[Dict[str, Optional[str]]]" = queue.Queue(max_queue)
+        self._session = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._bulk_supported = True
+        self.dropped = 0
+
+    def report(self, item_name: str, source: str = "sdk", user_id: Optional[str] = None):
+        """Queue a download event without waiting for the network"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(
+                {"item_name": item_name, "source": source, "user_id": user_id}
+            )
+        except queue.Full:
+            self.dropped += 1
+            logger.debug(f"Tracking queue full, dropped event for {item_name}")
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until all queued events have been sent (or timeout)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            time.sleep(0.05)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="dehug-download-reporter", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.flush, self.timeout)
+
+    def _run(self):
+        import requests
+
+        self._session = requests.Session()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self._send(batch)
+            except requests.RequestException as e:
+                logger.warning(f"[DeHug SDK] Tracking failed for {len(batch)} events: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _send(self, batch: List[Dict[str, Optional[str]]]):
+        if self._bulk_supported:
+            response = self._session.post(
+                f"{self.track_api}/track/downloads", json=batch, timeout=self.timeout
+            )
+            if response.status_code not in (404, 405):
+                response.raise_for_status()
+                return
+            # Older tracker without the bulk endpoint
+            self._bulk_supported = False
+
+        for event in batch:
+            response = self._session.post(
+                f"{self.track_api}/track/download", json=event, timeout=self.timeout
+            )
+            response.raise_for_status()
@@ -1,11 +1,16 @@
 """Utility functions for DeHug SDK"""
 
-import requests
+import os
+import threading
 from pathlib import Path
-from typing import Dict
+from typing import TYPE_CHECKING, Dict, Optional
 from .exceptions import NetworkError
 import logging
 
+# requests is imported where it's used so "import dehug" stays fast
+if TYPE_CHECKING:
+    import requests
+
 # Configure logging
 logger = logging.getLogger("dehug.utils")
 
@@ -24,6 +29,8 @@ def download_from_ipfs(
     cid: str, gateway: str = "https://gateway.pinata.cloud/ipfs"
 ) -> bytes:
     """Download raw content from IPFS using gateway"""
+    import requests
+
     url = f"{gateway.rstrip('/')}/{cid}"
 
     try:
@@ -35,6 +42,62 @@ def download_from_ipfs(
         raise NetworkError(f"Failed to download from IPFS: {e}")
 
 
+def open_ipfs_stream(
+    cid: str,
+    gateway: str = "https://gateway.pinata.cloud/ipfs",
+    timeout: float = 60,
+    params: Optional[Dict[str, str]] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> "requests.Response":
+    """Start a streaming download from IPFS; the caller must close the response"""
+    import requests
+
+    url = f"{gateway.rstrip('/')}/{cid}"
+
+    try:
+        logger.info(f"Streaming from IPFS: {url}")
+        response = requests.get(url, params=params, headers=headers, stream=True, timeout=timeout)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        raise NetworkError(f"Failed to download from IPFS: {e}") from e
+    # Let reads through response.raw undo any gzip transfer encoding
+    response.raw.decode_content = True
+    return response
+
+
+def download_to_file(
+    cid: str,
+    save_path: str,
+    gateway: str = "https://gateway.pinata.cloud/ipfs",
+    chunk_size: int = 1 << 20,
+    params: Optional[Dict[str, str]] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Path:
+    """Stream a CID to disk in chunks so memory use doesn't grow with file size"""
+    import requests
+
+    save_path_obj = Path(save_path)
+    save_path_obj.parent.mkdir(parents=True, exist_ok=True)
+    # Per-process and per-thread name so parallel downloads of the same CID don't interleave
+    partial = save_path_obj.with_name(
+        f"{save_path_obj.name}.{os.getpid()}.{threading.get_ident()}.partial"
+    )
+
+    response = open_ipfs_stream(cid, gateway, params=params, headers=headers)
+    try:
+        with open(partial, "wb") as f:
+            for chunk in response.iter_content(chunk_size):
+                f.write(chunk)
+    except requests.exceptions.RequestException as e:
+        partial.unlink(missing_ok=True)
+        raise NetworkError(f"Failed to download from IPFS: {e}")
+    finally:
+        response.close()
+
+    partial.replace(save_path_obj)
+    return save_path_obj
+
+
 def load_content_from_cid(
     cid: str, save_path: str, gateway: str = "https://gateway.pinata.cloud/ipfs"
 ) -> Path:
@@ -42,13 +105,7 @@ def load_content_from_cid(
     Download a file from IPFS CID and save it to the given path.
     Returns the Path object of the saved file.
     """
-    content = download_from_ipfs(cid, gateway)
-
-    save_path_obj = Path(save_path)
-    save_path_obj.parent.mkdir(parents=True, exist_ok=True)
-
-    with open(save_path_obj, "wb") as f:
-        f.write(content)
+    save_path_obj = download_to_file(cid, save_path, gateway)
 
     logger.info(f"Downloaded CID {cid} to {save_path_obj}")
     return save_path_obj.resolve()
@@ -34,11 +34,12 @@ setup(
     ],
     packages=find_packages(exclude=["tests", "tests.*", "examples", "examples.*"]),
     python_requires=">=3.8",
-    install_requires=["requests>=2.31.0", "pandas>=2.0.0", "pyarrow>=14.0.1"],
+    install_requires=["requests>=2.31.0", "pandas>=2.0.0", "pyarrow>=14.0.1", "numpy>=1.24.0"],
     entry_points={
         "console_scripts": [
             "dehug=dehug.cli:main",
             "dehug-server=dehug.server:run_server",
+            "dehug-gateway=dehug.gateway:main",
         ],
     },
     include_package_data=True,
@@ -0,0 +1,167 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import DownloadEvent, Entry
+from .rollups import add_to_rollups, count_rollups
+from .schemas import DownloadEventCreate
+
+SOURCE_COLUMNS = {"sdk": Entry.download_count_sdk, "ui": Entry.download_count_ui}
+
+# Built once and executed with a list of rows, so SQLAlchemy reuses the cached
+# compiled statement and sends the batch as multi-row INSERTs
+INSERT_EVENTS = insert(DownloadEvent)
+
+
+def upsert_entry_counts(db: Session, counts: Dict[str, Dict[str, int]]) -> Dict[str, int]:
+    """Create missing entries and add download counts in a single atomic statement
+
+    Uses INSERT ... ON CONFLICT (name) DO UPDATE so concurrent workers never
+    lose increments or race on the unique name. Returns entry ids by name.
+    Rows are sorted by name so concurrent batches lock rows in the same order
+    and can't deadlock each other.
+    """
+    rows = [
+        {
+            "name": name,
+            "total_downloads": count["total"],
+            "download_count_sdk": count["sdk"],
+            "download_count_ui": count["ui"],
+        }
+        for name, count in sorted(counts.items())
+    ]
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(Entry)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(Entry)
+    else:
+        return _increment_entry_counts(db, counts)
+
+    stmt = stmt.values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Entry.name],
+        set_={
+            "total_downloads": Entry.total_downloads + stmt.excluded.total_downloads,
+            "download_count_sdk": Entry.download_count_sdk + stmt.excluded.download_count_sdk,
+            "download_count_ui": Entry.download_count_ui + stmt.excluded.download_count_ui,
+        },
+    ).returning(Entry.name, Entry.id)
+    return dict(db.execute(stmt).all())
+
+
+def _increment_entry_counts(db: Session, counts: Dict[str, Dict[str, int]]) -> Dict[str, int]:
+    """Portable fallback for databases without ON CONFLICT support"""
+    for name, count in sorted(counts.items()):
+        increment = (
+            update(Entry)
+            .where(Entry.name == name)
+            .values(
+                total_downloads=Entry.total_downloads + count["total"],
+                download_count_sdk=Entry.download_count_sdk + count["sdk"],
+                download_count_ui=Entry.download_count_ui + count["ui"],
+            )
+        )
+        if db.execute(increment).rowcount:
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(
+                    insert(Entry).values(
+                        name=name,
+                        total_downloads=count["total"],
+                        download_count_sdk=count["sdk"],
+                        download_count_ui=count["ui"],
+                    )
+                )
+        except IntegrityError:
+            # Another worker created it between our UPDATE and INSERT
+            db.execute(increment)
+
+    return dict(db.execute(select(Entry.name, Entry.id).where(Entry.name.in_(counts))).all())
+
+
+def record_downloads(db: Session, events: List[DownloadEventCreate], timestamps: List[datetime] = None):
+    """Insert download events and apply counter and rollup increments in one transaction"""
+    if not events:
+        return
+    timestamps = timestamps or [datetime.utcnow()] * len(events)
+
+    counts = defaultdict(lambda: {"total": 0, "sdk": 0, "ui": 0})
+    for event in events:
+        counts[event.item_name]["total"] += 1
+        if event.source in ("sdk", "ui"):
+            counts[event.item_name][event.source] += 1
+
+    entry_ids = upsert_entry_counts(db, counts)
+
+    db.execute(
+        INSERT_EVENTS,
+        [
+            {
+                "item_name": event.item_name,
+                "source": event.source,
+                "user_id": event.user_id,
+                "timestamp": timestamp,
+                "model_id": entry_ids[event.item_name],
+            }
+            for event, timestamp in zip(events, timestamps)
+        ],
+    )
+    add_to_rollups(
+        db,
+        count_rollups(
+            (event.item_name, event.source, timestamp)
+            for event, timestamp in zip(events, timestamps)
+        ),
+    )
+
+    db.commit()
+
+
+def query_entry_stats(
+    db: Session,
+    prefix: Optional[str] = None,
+    source: Optional[str] = None,
+    top: Optional[int] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> Tuple[list, int]:
+    """Fetch download counters for a filtered page of entries
+
+    Without ``top`` rows are ordered by name (served by the unique name index);
+    with ``top`` they are the N most downloaded overall, or for ``source``.
+    Returns the rows and the number of entries matching the filters.
+    """
+    filters = []
+    if prefix:
+        filters.append(Entry.name.startswith(prefix, autoescape=True))
+    if source:
+        filters.append(SOURCE_COLUMNS[source] > 0)
+
+    matching = db.execute(select(func.count()).select_from(Entry).where(*filters)).scalar_one()
+
+    stmt = select(
+        Entry.name, Entry.download_count_sdk, Entry.download_count_ui, Entry.total_downloads
+    ).where(*filters)
+    if top:
+        # Pages stay within the top N: offset counts into it
+        if offset >= top:
+            return [], matching
+        ranking = SOURCE_COLUMNS[source] if source else Entry.total_downloads
+        stmt = stmt.order_by(ranking.desc(), Entry.name)
+        limit = min(limit, top - offset) if limit else top - offset
+    else:
+        stmt = stmt.order_by(Entry.name)
+    if limit:
+        stmt = stmt.limit(limit)
+    if offset:
+        stmt = stmt.offset(offset)
+
+    return db.execute(stmt).all(), matching
@@ -0,0 +1,125 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from .crud import record_downloads
+from .schemas import DownloadEventCreate
+
+logger = logging.getLogger("tracker.ingest")
+
+
+class DownloadBuffer:
+    """In-process write-behind buffer for download events
+
+    Events are acknowledged as soon as they are buffered and written in batches
+    when ``batch_size`` events are pending or every ``flush_interval`` seconds.
+    At most ``max_pending`` events are held in memory: once full, ``add``
+    refuses new events, so an unclean exit loses at most that many.
+    A clean shutdown (``stop``) flushes everything that was accepted.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending: List[Tuple[DownloadEventCreate, datetime]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self.flushed = 0
+        self.rejected = 0
+        self.failed_flushes = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def add(self, event: DownloadEventCreate) -> bool:
+        """Buffer an event; returns False if the buffer is full"""
+        return self.add_many([event])
+
+    def add_many(self, events: List[DownloadEventCreate]) -> bool:
+        """Buffer a batch of events, all or nothing; returns False if they don't fit"""
+        with self._lock:
+            if len(self._pending) + len(events) > self.max_pending:
+                self.rejected += len(events)
+                return False
+            # Keep the acceptance time, not the time the batch is written
+            accepted_at = datetime.utcnow()
+            self._pending.extend((event, accepted_at) for event in events)
+            full = len(self._pending) >= self.batch_size
+
+        if full:
+            self._wakeup.set()
+        return True
+
+    def flush(self) -> int:
+        """Write all pending events in one transaction; returns the number written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            db = self.session_factory()
+            try:
+                record_downloads(db, [event for event, _ in batch], [ts for _, ts in batch])
+            except Exception as e:
+                db.rollback()
+                self.failed_flushes += 1
+                logger.error(f"Failed to flush {len(batch)} download events: {e}")
+                # Put the batch back in front, still respecting the bound
+                with self._lock:
+                    room = max(self.max_pending - len(self._pending), 0)
+                    self.rejected += max(len(batch) - room, 0)
+                    self._pending = batch[:room] + self._pending
+                return 0
+            finally:
+                db.close()
+
+            self.flushed += len(batch)
+            return len(batch)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="download-buffer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the flush thread and write out everything still buffered"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        if self._pending:
+            logger.error(f"Dropping {len(self._pending)} download events on shutdown")
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "flushed": self.flushed,
+            "rejected": self.rejected,
+            "failed_flushes": self.failed_flushes,
+        }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .db import Base
@@ -12,9 +12,9 @@ class Entry(Base):
     upload_date = Column(DateTime, default=datetime.utcnow)
     filename = Column(String)
 
-    total_downloads = Column(Integer, default=0)
-    download_count_sdk = Column(Integer, default=0)
-    download_count_ui = Column(Integer, default=0)
+    total_downloads = Column(Integer, default=0, index=True)
+    download_count_sdk = Column(Integer, default=0, index=True)
+    download_count_ui = Column(Integer, default=0, index=True)
 
     download_events = relationship("DownloadEvent", back_populates="model")
 
@@ -23,10 +23,36 @@ class DownloadEvent(Base):
     __tablename__ = "download_events"
 
     id = Column(Integer, primary_key=True, index=True)
-    item_name = Column(String)
+    item_name = Column(String, index=True)
     source = Column(String)     # 'sdk' or 'ui'
     user_id = Column(String, nullable=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
 
     model_id = Column(Integer, ForeignKey("entries.id"), nullable=True)
     model = relationship("Entry", back_populates="download_events")
+
+
+class DownloadRollup(Base):
+    """Download counts per item and source, bucketed by hour or day"""
+
+    __tablename__ = "download_rollups"
+    __table_args__ = (
+        # Also serves range queries: granularity + item, then a bucket range
+        UniqueConstraint("granularity", "item_name", "bucket_start", "source", name="uq_download_rollup_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String, nullable=False)  # 'hour' or 'day'
+    bucket_start = Column(DateTime, nullable=False)
+    item_name = Column(String, nullable=False)
+    source = Column(String, nullable=False)
+    count = Column(Integer, default=0, nullable=False)
+
+
+class SchemaMigration(Base):
+    """One-off data migrations that have been claimed, keyed by name"""
+
+    __tablename__ = "schema_migrations"
+
+    name = Column(String, primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow, nullable=False)
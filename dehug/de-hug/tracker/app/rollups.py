@@ -0,0 +1,228 @@
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import DownloadEvent, DownloadRollup, SchemaMigration
+
+logger = logging.getLogger("tracker.rollups")
+
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+# (granularity, item_name, bucket_start, source)
+RollupKey = Tuple[str, str, datetime, str]
+
+# schema_migrations entry recording that existing raw events were rolled up
+BACKFILL_MIGRATION = "rollup_backfill"
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its hour or day"""
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def count_rollups(events: Iterable[Tuple[str, str, datetime]]) -> Dict[RollupKey, int]:
+    """Aggregate (item_name, source, timestamp) tuples into rollup increments"""
+    counts: Dict[RollupKey, int] = Counter()
+    for item_name, source, timestamp in events:
+        for granularity in GRANULARITIES:
+            counts[(granularity, item_name, bucket_start(timestamp, granularity), source)] += 1
+    return counts
+
+
+def add_to_rollups(db: Session, counts: Dict[RollupKey, int]):
+    """Add counts to their rollup buckets with an atomic upsert (no commit)
+
+    Rows are sorted by bucket key so concurrent batches lock rows in the same
+    order and can't deadlock each other.
+    """
+    if not counts:
+        return
+
+    rows = [
+        {
+            "granularity": granularity,
+            "item_name": item_name,
+            "bucket_start": start,
+            "source": source,
+            "count": count,
+        }
+        for (granularity, item_name, start, source), count in sorted(counts.items())
+    ]
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(DownloadRollup)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(DownloadRollup)
+    else:
+        _increment_rollups(db, rows)
+        return
+
+    stmt = stmt.values(rows)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["granularity", "item_name", "bucket_start", "source"],
+            set_={"count": DownloadRollup.count + stmt.excluded["count"]},
+        )
+    )
+
+
+def _increment_rollups(db: Session, rows: List[dict]):
+    """Portable fallback for databases without ON CONFLICT support"""
+    for row in rows:
+        increment = (
+            update(DownloadRollup)
+            .where(
+                DownloadRollup.granularity == row["granularity"],
+                DownloadRollup.item_name == row["item_name"],
+                DownloadRollup.bucket_start == row["bucket_start"],
+                DownloadRollup.source == row["source"],
+            )
+            .values(count=DownloadRollup.count + row["count"])
+        )
+        if db.execute(increment).rowcount:
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(insert(DownloadRollup).values(**row))
+        except IntegrityError:
+            db.execute(increment)
+
+
+def query_timeseries(
+    db: Session,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    item_name: Optional[str] = None,
+    source: Optional[str] = None,
+) -> List[dict]:
+    """Per-bucket sdk/ui/total counts in [start, end), zero-filled"""
+    start = bucket_start(start, granularity)
+    filters = [
+        DownloadRollup.granularity == granularity,
+        DownloadRollup.bucket_start >= start,
+        DownloadRollup.bucket_start < end,
+    ]
+    if item_name:
+        filters.append(DownloadRollup.item_name == item_name)
+    if source:
+        filters.append(DownloadRollup.source == source)
+
+    rows = db.execute(
+        select(
+            DownloadRollup.bucket_start, DownloadRollup.source, func.sum(DownloadRollup.count)
+        )
+        .where(*filters)
+        .group_by(DownloadRollup.bucket_start, DownloadRollup.source)
+    ).all()
+
+    counts: Dict[datetime, Dict[str, int]] = {}
+    for start_at, row_source, count in rows:
+        counts.setdefault(start_at, {})[row_source] = count
+
+    buckets = []
+    step = GRANULARITIES[granularity]
+    current = start
+    while current < end:
+        by_source = counts.get(current, {})
+        buckets.append(
+            {
+                "bucket_start": current,
+                "sdk": by_source.get("sdk", 0),
+                "ui": by_source.get("ui", 0),
+                "total": sum(by_source.values()),
+            }
+        )
+        current += step
+    return buckets
+
+
+def backfill_rollups(db: Session, batch_size: int = 10000) -> int:
+    """Build rollups from raw events that were recorded before rollups existed
+
+    Runs once per database: a schema_migrations row claims the backfill inside
+    the same transaction, so concurrent workers starting together don't double
+    count. Must run before compaction so old raw events keep their history.
+    """
+    try:
+        with db.begin_nested():
+            db.execute(insert(SchemaMigration).values(name=BACKFILL_MIGRATION))
+    except IntegrityError:
+        db.rollback()
+        return 0
+
+    counts: Dict[RollupKey, int] = Counter()
+    events = 0
+    result = db.execute(
+        select(DownloadEvent.item_name, DownloadEvent.source, DownloadEvent.timestamp)
+        .where(DownloadEvent.timestamp.is_not(None))
+        .execution_options(yield_per=batch_size)
+    )
+    for item_name, source, timestamp in result:
+        for granularity in GRANULARITIES:
+            counts[(granularity, item_name, bucket_start(timestamp, granularity), source or "")] += 1
+        events += 1
+
+    # Insert in chunks to stay under bound-parameter limits
+    keys = list(counts)
+    for i in range(0, len(keys), 500):
+        add_to_rollups(db, {key: counts[key] for key in keys[i : i + 500]})
+    db.commit()
+    if events:
+        logger.info(f"Backfilled rollups from {events} download events")
+    return events
+
+
+def compact_events(db: Session, retention_days: int) -> int:
+    """Delete raw events older than the retention window; rollups keep their counts"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    result = db.execute(delete(DownloadEvent).where(DownloadEvent.timestamp < cutoff))
+    db.commit()
+    return result.rowcount
+
+
+class RetentionJob:
+    """Background thread that periodically compacts raw download events"""
+
+    def __init__(self, session_factory, retention_days: int, interval: float = 3600):
+        self.session_factory = session_factory
+        self.retention_days = retention_days
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def run_once(self) -> int:
+        db = self.session_factory()
+        try:
+            deleted = compact_events(db, self.retention_days)
+            if deleted:
+                logger.info(f"Compacted {deleted} download events older than {self.retention_days} days")
+            return deleted
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Download event compaction failed: {e}")
+            return 0
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="event-retention", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
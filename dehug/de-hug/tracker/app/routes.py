@@ -1,51 +1,144 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from .db import SessionLocal
-from .models import DownloadEvent, Entry
-from .schemas import DownloadEventCreate
-from collections import defaultdict
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from .db import SessionLocal, AsyncSessionLocal
+from .cache import TTLCache
+from .crud import query_entry_stats, record_downloads
+from .ingest import DownloadBuffer
+from .rollups import GRANULARITIES, query_timeseries
+from .schemas import DownloadEventCreate, TimeseriesResponse
+from datetime import datetime, timezone
+from typing import List, Optional
+import hashlib
+import json
+from config import (INGEST_MODE, FLUSH_BATCH_SIZE, FLUSH_INTERVAL, MAX_PENDING_EVENTS,
+                    MAX_BULK_EVENTS, STATS_CACHE_TTL, MAX_TIMESERIES_BUCKETS)
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+download_buffer = None
+if INGEST_MODE == "buffered":
+    download_buffer = DownloadBuffer(
+        SessionLocal,
+        batch_size=FLUSH_BATCH_SIZE,
+        flush_interval=FLUSH_INTERVAL,
+        max_pending=MAX_PENDING_EVENTS,
+    )
+
+MAX_STATS_PAGE = 1000
+stats_cache = TTLCache(STATS_CACHE_TTL)
+
+
+def _with_session(func, *args):
+    with SessionLocal() as db:
+        return func(db, *args)
+
+
+async def run_db(func, *args):
+    """Run ``func(session, *args)`` on the async engine if enabled, else in the threadpool
+
+    Handlers only touch the database through here, so requests that don't
+    need it (buffered ingestion, stats cache hits) never wait for a thread.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(func, *args)
+    return await run_in_threadpool(_with_session, func, *args)
+
 
 @router.post("/track/download")
-def track_download(event: DownloadEventCreate, db: Session = Depends(get_db)):
-    item_name = event.item_name
-    model = db.query(Entry).filter_by(name=item_name).first()
-
-    if not model:
-        model = Entry(name=item_name, total_downloads=0)
-        db.add(model)
-        db.commit()
-        db.refresh(model)
-
-    download_event = DownloadEvent(item_name=event.item_name, source=event.source)
-    db.add(download_event)
-
-    model.total_downloads += 1
-    if event.source == "sdk":
-        model.download_count_sdk += 1
-    elif event.source == "ui":
-        model.download_count_ui += 1
-
-    db.commit()
+async def track_download(event: DownloadEventCreate):
+    if download_buffer is not None:
+        if not download_buffer.add(event):
+            raise HTTPException(status_code=503, detail="Download buffer full, retry later")
+        return {"message": "Download tracked"}
+
+    await run_db(record_downloads, [event])
     return {"message": "Download tracked"}
 
 
+@router.post("/track/downloads")
+async def track_downloads(events: List[DownloadEventCreate]):
+    if len(events) > MAX_BULK_EVENTS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {MAX_BULK_EVENTS} events per request"
+        )
+
+    if download_buffer is not None:
+        if not download_buffer.add_many(events):
+            raise HTTPException(status_code=503, detail="Download buffer full, retry later")
+        return {"message": "Downloads tracked", "count": len(events)}
+
+    await run_db(record_downloads, events)
+    return {"message": "Downloads tracked", "count": len(events)}
+
+
 @router.get("/track/stats")
-def get_stats(db: Session = Depends(get_db)):
-    models = db.query(Entry).all()
+async def get_stats(
+    request: Request,
+    prefix: Optional[str] = None,
+    source: Optional[str] = Query(None, pattern="^(sdk|ui)$"),
+    top: Optional[int] = Query(None, ge=1, le=MAX_STATS_PAGE),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_STATS_PAGE),
+    offset: int = Query(0, ge=0),
+):
+    cache_key = (prefix, source, top, limit, offset)
+    cached = stats_cache.get(cache_key)
+    if cached is None:
+        rows, matching = await run_db(query_entry_stats, prefix, source, top, limit, offset)
+        body = json.dumps(
+            {
+                name: {"sdk": sdk, "ui": ui, "total": total}
+                for name, sdk, ui, total in rows
+            }
+        ).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        cached = (body, etag, matching)
+        stats_cache.set(cache_key, cached)
+
+    body, etag, matching = cached
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"max-age={int(STATS_CACHE_TTL)}",
+        "X-Total-Count": str(matching),
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as naive UTC; convert aware query bounds to match"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@router.get("/track/stats/timeseries", response_model=TimeseriesResponse)
+async def get_timeseries(
+    item_name: Optional[str] = None,
+    granularity: str = Query("hour", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    source: Optional[str] = Query(None, pattern="^(sdk|ui)$"),
+):
+    """Download counts per hour or day, answered from the rollup tables"""
+    step = GRANULARITIES[granularity]
+    start, end = naive_utc(start), naive_utc(end)
+    end = end or datetime.utcnow()
+    start = start or end - (24 if granularity == "hour" else 30) * step
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start) / step > MAX_TIMESERIES_BUCKETS:
+        raise HTTPException(
+            status_code=400, detail=f"Range covers more than {MAX_TIMESERIES_BUCKETS} buckets"
+        )
+
+    buckets = await run_db(query_timeseries, granularity, start, end, item_name, source)
     return {
-        model.name: {
-            "sdk": model.download_count_sdk,
-            "ui": model.download_count_ui,
-            "total": model.total_downloads
-        }
-        for model in models
+        "item_name": item_name,
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "buckets": buckets,
     }
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 
 class DownloadEventCreate(BaseModel):
@@ -14,3 +14,18 @@ class DownloadStatsResponse(BaseModel):
     sdk: int
     ui: int
     total: int
+
+
+class TimeseriesBucket(BaseModel):
+    bucket_start: datetime
+    sdk: int
+    ui: int
+    total: int
+
+
+class TimeseriesResponse(BaseModel):
+    item_name: Optional[str] = None
+    granularity: str
+    start: datetime
+    end: datetime
+    buckets: List[TimeseriesBucket]
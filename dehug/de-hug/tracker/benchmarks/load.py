@@ -0,0 +1,204 @@
+"""
+Load test POST /track/download and check counters under concurrency
+
+Fires concurrent download events at the tracker, reports events/sec and
+latency percentiles, then asserts that the Entry counters for this run add up
+to exactly the events that were accepted. Exits non-zero if they don't.
+
+By default the app runs in-process against a fresh temporary SQLite database.
+Pass --url to target a running server instead (e.g. uvicorn with several
+workers, or buffered ingestion via TRACKER_INGEST_MODE=buffered).
+
+Usage (from the tracker directory):
+    python -m benchmarks.load --events 5000 --concurrency 64
+    uvicorn main:app --workers 4 &
+    python -m benchmarks.load --url http://localhost:8000 --output run.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+def make_events(run_id: str, count: int, items: int) -> List[Dict[str, str]]:
+    return [
+        {
+            "item_name": f"{run_id}-model-{i % items}",
+            "source": "sdk" if i % 3 else "ui",
+        }
+        for i in range(count)
+    ]
+
+
+async def fire(client: httpx.AsyncClient, events: List[Dict[str, str]], concurrency: int) -> List[Dict[str, Any]]:
+    samples = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for event in events:
+        queue.put_nowait(event)
+
+    async def worker():
+        while not queue.empty():
+            event = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.post("/track/download", json=event)
+                error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+            samples.append(
+                {"event": event, "latency": time.perf_counter() - start, "error": error}
+            )
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+def expected_counts(samples: List[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """Counters the tracker should hold for the events it accepted"""
+    expected: Dict[str, Counter] = {}
+    for sample in samples:
+        if sample["error"]:
+            continue
+        event = sample["event"]
+        counts = expected.setdefault(event["item_name"], Counter())
+        counts["total"] += 1
+        counts[event["source"]] += 1
+    return {
+        name: {"sdk": counts["sdk"], "ui": counts["ui"], "total": counts["total"]}
+        for name, counts in expected.items()
+    }
+
+
+async def fetch_counts(client: httpx.AsyncClient, run_id: str) -> Dict[str, Dict[str, int]]:
+    response = await client.get("/track/stats", params={"prefix": f"{run_id}-"})
+    response.raise_for_status()
+    return response.json()
+
+
+async def wait_for_counts(client, run_id, expected, settle: float) -> Dict[str, Dict[str, int]]:
+    """Poll /track/stats until counters match; buffered ingestion and the stats cache lag"""
+    deadline = time.monotonic() + settle
+    while True:
+        actual = await fetch_counts(client, run_id)
+        if actual == expected or time.monotonic() >= deadline:
+            return actual
+        await asyncio.sleep(0.5)
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: List[Dict[str, Any]], wall_time: float) -> Dict[str, Any]:
+    latencies = [s["latency"] * 1000 for s in samples if not s["error"]]
+    errors = Counter(s["error"] for s in samples if s["error"])
+    return {
+        "events": len(samples),
+        "accepted": len(latencies),
+        "errors": dict(errors),
+        "events_per_s": len(latencies) / wall_time if wall_time else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+        },
+    }
+
+
+async def run_remote(args, events, run_id):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+        samples = await fire(client, events, args.concurrency)
+        wall_time = time.perf_counter() - start
+        actual = await wait_for_counts(client, run_id, expected_counts(samples), args.settle)
+    return samples, wall_time, actual
+
+
+async def run_in_process(args, events, run_id):
+    # app.db reads DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/load.db"
+    from main import app
+    from app.routes import stats_cache
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://tracker", timeout=args.timeout
+        ) as client:
+            start = time.perf_counter()
+            samples = await fire(client, events, args.concurrency)
+            wall_time = time.perf_counter() - start
+
+    # Shutdown flushed any buffered events; read the counters afresh
+    stats_cache.clear()
+    async with httpx.AsyncClient(transport=transport, base_url="http://tracker") as client:
+        actual = await fetch_counts(client, run_id)
+    return samples, wall_time, actual
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="Running tracker; default runs the app in-process")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=20, help="Distinct item names")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--settle", type=float, default=15, help="Seconds to wait for counters to catch up")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    # Unique names keep the check independent of data already in the database
+    run_id = f"loadtest-{int(time.time() * 1000)}"
+    events = make_events(run_id, args.events, args.items)
+    runner = run_remote if args.url else run_in_process
+    samples, wall_time, actual = asyncio.run(runner(args, events, run_id))
+
+    expected = expected_counts(samples)
+    mismatched = sorted(
+        name for name in set(expected) | set(actual) if expected.get(name) != actual.get(name)
+    )
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "url": args.url or "in-process",
+            "run_id": run_id,
+            "concurrency": args.concurrency,
+            "wall_time_s": wall_time,
+            "python": platform.python_version(),
+        },
+        "load": summarize(samples, wall_time),
+        "consistency": {
+            "expected_total": sum(c["total"] for c in expected.values()),
+            "recorded_total": sum(c["total"] for c in actual.values()),
+            "mismatched_items": mismatched,
+            "ok": not mismatched,
+        },
+    }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+    if mismatched:
+        raise SystemExit(f"Counter mismatch for {len(mismatched)} items")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "sync" writes every event before responding; "buffered" acknowledges
+# immediately and writes events in batches from a background thread
+INGEST_MODE = os.getenv("TRACKER_INGEST_MODE", "sync")
+FLUSH_BATCH_SIZE = int(os.getenv("TRACKER_FLUSH_BATCH_SIZE", "500"))  # Flush when this many events are pending
+FLUSH_INTERVAL = float(os.getenv("TRACKER_FLUSH_INTERVAL", "1.0"))  # Seconds between time-based flushes
+# Events held in memory at most; beyond this new events are rejected, which
+# bounds how many can be lost if the process dies without a clean shutdown
+MAX_PENDING_EVENTS = int(os.getenv("TRACKER_MAX_PENDING_EVENTS", "10000"))
+
+MAX_BULK_EVENTS = int(os.getenv("TRACKER_MAX_BULK_EVENTS", "1000"))  # Largest batch accepted by /track/downloads
+STATS_CACHE_TTL = float(os.getenv("TRACKER_STATS_CACHE_TTL", "5"))  # Seconds /track/stats responses are reused
+
+# Raw download events older than this are deleted (their counts live on in the
+# hourly/daily rollups); 0 keeps raw events forever
+EVENT_RETENTION_DAYS = int(os.getenv("TRACKER_EVENT_RETENTION_DAYS", "0"))
+RETENTION_INTERVAL = float(os.getenv("TRACKER_RETENTION_INTERVAL", "3600"))  # Seconds between compaction runs
+MAX_TIMESERIES_BUCKETS = int(os.getenv("TRACKER_MAX_TIMESERIES_BUCKETS", "2000"))
@@ -1,7 +1,9 @@
 from fastapi import FastAPI
-from app.routes import router
+from app.routes import router, download_buffer
 from app.models import Base
-from app.db import engine
+from app.db import engine, create_indexes, SessionLocal
+from app.rollups import RetentionJob, backfill_rollups
+from config import EVENT_RETENTION_DAYS, RETENTION_INTERVAL
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
@@ -16,9 +18,36 @@ app.add_middleware(
 
 
 Base.metadata.create_all(bind=engine)
+create_indexes(engine)
 app.include_router(router)
 
 
+retention_job = None
+if EVENT_RETENTION_DAYS > 0:
+    retention_job = RetentionJob(SessionLocal, EVENT_RETENTION_DAYS, RETENTION_INTERVAL)
+
+
+@app.on_event("startup")
+def start_ingest():
+    # Rollups must cover existing events before any of them are compacted
+    with SessionLocal() as db:
+        backfill_rollups(db)
+
+    if download_buffer is not None:
+        download_buffer.start()
+    if retention_job is not None:
+        retention_job.start()
+
+
+@app.on_event("shutdown")
+def stop_ingest():
+    # Flush buffered events so a clean shutdown loses nothing
+    if download_buffer is not None:
+        download_buffer.stop()
+    if retention_job is not None:
+        retention_job.stop()
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",